@@ -1,15 +1,54 @@
-from flask import Flask
+import os
+from flask import Flask, current_app
+from werkzeug.local import LocalProxy
 from config import Config
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from app.database import Database
 from flask_login import LoginManager
 
+''' Extensions are created here without an app and bound to each app by create_app(). Flask-SQLAlchemy (with the engine profiles of app/database.py) and Flask-Login keep their per-app state in the app themselves. The app's own extensions (task list cache, password hasher, user cache, instrumentation, rate limiter) are made by create_app() for each app, and these proxies find the one of the current app, so several apps with different configurations can live in one process, e.g. in tests. '''
+db = Database()                      # Database, Engine Options From DATABASE_PROFILE
+login = LoginManager()               # Login Manager
+login.login_view = 'main.login'      # Where login_required sends anonymous users
+task_cache = LocalProxy(lambda: current_app.extensions['task_cache'])          # Rendered Task List Cache
+hasher = LocalProxy(lambda: current_app.extensions['password_hasher'])         # Password Hashing
+user_cache = LocalProxy(lambda: current_app.extensions['user_cache'])          # Logged In User Cache
+instrumentation = LocalProxy(lambda: current_app.extensions['instrumentation'])  # Request Timing And Metrics, Opt-In
+rate_limiter = LocalProxy(lambda: current_app.extensions['rate_limiter'])       # Sign-In Attempt Rate Limiting
 
-app = Flask(__name__)           # App Initialization
-app.config.from_object(Config)  # Configuration
-db = SQLAlchemy(app)            # Database Initialization
-migrate = Migrate(app, db)      # DB Migration Initialization
-login = LoginManager(app)       # Login Manager
 
+''' Application factory. Builds an app for 'config_class', binds the extensions to it, and registers the blueprints. Flask-Migrate (and with it Alembic) and the maintenance commands are only loaded when the app is made by the 'flask' command, so gunicorn workers do not pay for them. '''
+def create_app(config_class=Config):
+    from app.cache import TaskListCache, UserCache
+    from app.hashing import PasswordHasher
+    from app.instrumentation import Instrumentation
+    from app.ratelimit import RateLimiter
 
-from app import routes, models, errors
+    app = Flask(__name__)                   # App Initialization
+    app.config.from_object(config_class)    # Configuration
+    Instrumentation(app)
+    db.init_app(app)
+    login.init_app(app)
+    TaskListCache(app)
+    PasswordHasher(app)
+    UserCache(app)
+    RateLimiter(app)
+    app.extensions['instrumentation'].add_counters(
+        'todo_task_cache', app.extensions['task_cache'].stats, 'Task list cache lookups.')
+    app.extensions['instrumentation'].add_counters(
+        'todo_rate_limit', app.extensions['rate_limiter'].stats, 'Sign-in attempts allowed and rejected by the rate limiter.')
+
+    from app.routes import bp as main_bp
+    app.register_blueprint(main_bp)
+    from app.errors import bp as errors_bp
+    app.register_blueprint(errors_bp)
+    from app.api import bp as api_bp
+    app.register_blueprint(api_bp, url_prefix='/api')
+
+    # The flask command sets FLASK_RUN_FROM_CLI before it loads the app.
+    if os.environ.get('FLASK_RUN_FROM_CLI'):
+        from flask_migrate import Migrate
+        from app import cli
+        Migrate(app, db)            # DB Migration Initialization
+        cli.register(app)
+
+    return app
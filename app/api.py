@@ -0,0 +1,271 @@
+''' JSON API for integrations. A client gets a bearer token from POST /api/tokens with HTTP Basic auth (username or email, and password), and sends it as 'Authorization: Bearer <token>' with every other request. POST /api/tasks/batch applies many task changes in one transaction, using one bulk statement per kind of change instead of a commit per task. '''
+
+import datetime
+import sqlite3
+from collections import Counter
+from functools import wraps
+from flask import Blueprint, current_app, g, jsonify, request
+from sqlalchemy import bindparam, text
+from werkzeug.http import HTTP_STATUS_CODES
+from app import db, rate_limiter
+from app.hashing import HashingBusy
+from app.ratelimit import RateLimited
+from app.forms import DueDateForm
+from app.models import User, Task, DUE_RANGES, due_date_range, parse_day
+
+bp = Blueprint('api', __name__)
+
+# The due date format accepted by DueDateForm, which the API accepts as well.
+DUE_DATE_FORMAT = DueDateForm.due_date.kwargs['format']
+
+# Longest range of days GET /api/tasks/due counts tasks for.
+MAX_DUE_RANGE_DAYS = 366
+
+
+def error_response(status_code, message=None):
+    payload = {'error': HTTP_STATUS_CODES.get(status_code, 'Unknown error')}
+    if message:
+        payload['message'] = message
+    response = jsonify(payload)
+    response.status_code = status_code
+    return response
+
+
+''' Decorator for API views that need a user. The user of a valid bearer token is stored in g.api_user. '''
+def token_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        user = User.check_token(token) if scheme.lower() == 'bearer' and token else None
+        if user is None:
+            return error_response(401, 'A valid bearer token is required.')
+        g.api_user = user
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# Issue a token for the user of the HTTP Basic credentials.
+@bp.route('/tokens', methods=['POST'])
+def get_token():
+    auth = request.authorization
+    if auth is None:
+        return error_response(401, 'HTTP Basic credentials are required.')
+    # Rate limited like the login page, before the user is looked up or the password hashed.
+    try:
+        rate_limiter.hit(auth.username)
+    except RateLimited as e:
+        response = error_response(429, 'Too many sign-in attempts, please try again later.')
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+    user = User.find_by_login(auth.username)
+    try:
+        if user is None or not user.check_and_upgrade_password(auth.password):
+            rate_limiter.failed(auth.username)
+            return error_response(401, 'Invalid username or password.')
+    except HashingBusy:
+        return error_response(503, 'Too many sign-ins at once, please try again.')
+    token = user.get_token(current_app.config['API_TOKEN_EXPIRES_IN'])
+    db.session.commit()
+    return jsonify({'token': token, 'expires': user.token_expiration.isoformat() + 'Z'})
+
+
+# Revoke the token used to make this request.
+@bp.route('/tokens', methods=['DELETE'])
+@token_required
+def revoke_token():
+    g.api_user.revoke_token()
+    db.session.commit()
+    return '', 204
+
+
+''' List the user's tasks in their sort preference, one keyset page at a time. Pass the returned 'next' or 'prev' cursor as the 'after' or 'before' parameter to get the neighbouring page. '''
+@bp.route('/tasks', methods=['GET'])
+@token_required
+def get_tasks():
+    per_page = min(request.args.get('per_page', current_app.config['TASKS_PER_PAGE'], type=int),
+                   current_app.config['API_MAX_PER_PAGE'])
+    page = g.api_user.get_page_of_tasks(after=request.args.get('after'), before=request.args.get('before'),
+                                        per_page=max(per_page, 1))
+    return jsonify({'tasks': [task.to_dict() for task in page.tasks],
+                    'next': page.next_cursor, 'prev': page.prev_cursor})
+
+
+''' List the user's tasks due in a range of days, by due date, one keyset page at a time like GET /api/tasks, with the number of tasks due on each day of the whole range for a calendar. The range is either 'range' ('week', 'month', or 'overdue') around the day 'start' (default today), or 'start' and 'end', the first day and the day after the last. Days are written YYYY-MM-DD. '''
+@bp.route('/tasks/due', methods=['GET'])
+@token_required
+def get_tasks_due():
+    today = datetime.datetime.utcnow().date()
+    try:
+        anchor = parse_day(request.args['start']) if 'start' in request.args else today
+        end = parse_day(request.args['end']) if 'end' in request.args else None
+    except ValueError:
+        return error_response(400, "'start' and 'end' must be dates in the form YYYY-MM-DD.")
+    if end is None:
+        range_name = request.args.get('range', 'week')
+        if range_name not in DUE_RANGES:
+            return error_response(400, f"'range' must be one of {', '.join(DUE_RANGES)}.")
+        start, end = due_date_range(range_name, today if range_name == 'overdue' else anchor)
+    else:
+        start = anchor
+        if not 0 < (end - start).days <= MAX_DUE_RANGE_DAYS:
+            return error_response(400, f"'end' must be after 'start', by at most {MAX_DUE_RANGE_DAYS} days.")
+
+    per_page = min(request.args.get('per_page', current_app.config['TASKS_PER_PAGE'], type=int),
+                   current_app.config['API_MAX_PER_PAGE'])
+    page = g.api_user.get_page_of_tasks_due(start, end, after=request.args.get('after'),
+                                            before=request.args.get('before'), per_page=max(per_page, 1))
+    counts = g.api_user.count_tasks_due_by_day(start, end)
+    return jsonify({'start': start.isoformat() if start else None, 'end': end.isoformat(),
+                    'counts': {day.isoformat(): count for day, count in sorted(counts.items())},
+                    'tasks': [task.to_dict() for task in page.tasks],
+                    'next': page.next_cursor, 'prev': page.prev_cursor})
+
+
+''' Validate a task body, returning (body, error). PostgreSQL cannot store NUL characters in text, so they are refused on every database. '''
+def parse_body(item):
+    body = item.get('body')
+    if not isinstance(body, str):
+        return None, 'body must be a string'
+    if '\x00' in body:
+        return None, 'body must not contain NUL characters'
+    if len(body) > Task.body.type.length:
+        return None, f'body must be at most {Task.body.type.length} characters'
+    return body, None
+
+
+''' Validate an optional due date, returning (due_date, error). A missing or null due date is None. '''
+def parse_due_date(item):
+    value = item.get('due_date')
+    if value is None:
+        return None, None
+    try:
+        return datetime.datetime.strptime(value, DUE_DATE_FORMAT).date(), None
+    except (TypeError, ValueError):
+        return None, 'due_date must be a date in the form YYYY-MM-DD or null'
+
+
+''' A task id in a request: a JSON integer. JSON true and false are bools, which Python counts as ints, so they are refused here rather than taken for 1 and 0. '''
+def is_task_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+''' One multi-row INSERT ... RETURNING id of 'new_tasks' on SQLite, which SQLAlchemy 1.3 cannot compile RETURNING for, written out with typed parameters. The columns with defaults are filled in here, as Core would. SQLite gives the rows the next rowids in the order of VALUES, but does not promise to return them in that order, so the ids are sorted. '''
+def _sqlite_insert_returning(new_tasks):
+    now = datetime.datetime.utcnow()
+    columns = ('body', 'due_date', 'user_id', 'timestamp')
+    rows, params = [], []
+    for number, task in enumerate(new_tasks):
+        names = [f'{column}_{number}' for column in columns]
+        rows.append('(' + ', '.join(f':{name}' for name in names) + ')')
+        params.extend(bindparam(name, task.get(column, now), type_=Task.__table__.c[column].type)
+                      for column, name in zip(columns, names))
+    statement = text(f"INSERT INTO task ({', '.join(columns)}) VALUES {', '.join(rows)} RETURNING id")
+    return sorted(task_id for task_id, in db.session.execute(statement.bindparams(*params)))
+
+
+''' Insert tasks with bulk statements, returning their ids in order. PostgreSQL, and SQLite from 3.35, return them from one multi-row INSERT ... RETURNING per chunk; elsewhere the session inserts and fetches each new row's id in turn. '''
+def insert_tasks(new_tasks, chunk_size=500):
+    if not new_tasks:
+        return []
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35):
+        return [task_id for start in range(0, len(new_tasks), chunk_size)
+                for task_id in _sqlite_insert_returning(new_tasks[start:start + chunk_size])]
+    if dialect != 'postgresql':
+        db.session.bulk_insert_mappings(Task, new_tasks, return_defaults=True)
+        return [task['id'] for task in new_tasks]
+    ids = []
+    for start in range(0, len(new_tasks), chunk_size):
+        statement = Task.__table__.insert().values(new_tasks[start:start + chunk_size]).returning(Task.id)
+        ids.extend(task_id for task_id, in db.session.execute(statement))
+    return ids
+
+
+''' Apply a batch of task changes. The request body is a JSON object with up to three lists:
+
+    {"create": [{"body": "...", "due_date": "2020-01-31"}, ...],
+     "update": [{"id": 12, "due_date": "2020-02-01"}, {"id": 13, "due_date": null}, ...],
+     "delete": [14, 15, ...]}
+
+Each item is validated and checked for ownership on its own. A task id given more than once, in 'update', 'delete', or both, is ambiguous, so every item with it gets the status 'conflict'. Items that fail are reported and skipped, and everything else is written with one bulk INSERT, UPDATE, and DELETE in a single transaction. The response has a result for every item, in the same order as the request, and the result of each created task has its id. '''
+@bp.route('/tasks/batch', methods=['POST'])
+@token_required
+def batch_tasks():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return error_response(400, 'The request body must be a JSON object.')
+    creates = data.get('create') or []
+    updates = data.get('update') or []
+    deletes = data.get('delete') or []
+    if not all(isinstance(items, list) for items in (creates, updates, deletes)):
+        return error_response(400, "'create', 'update' and 'delete' must be lists.")
+    if len(creates) + len(updates) + len(deletes) > current_app.config['API_MAX_BATCH']:
+        return error_response(413, f"A batch holds at most {current_app.config['API_MAX_BATCH']} items.")
+
+    user = g.api_user
+    results = {'create': [], 'update': [], 'delete': []}
+
+    new_tasks = []
+    for item in creates:
+        if not isinstance(item, dict):
+            results['create'].append({'status': 'error', 'error': 'item must be an object'})
+            continue
+        body, error = parse_body(item)
+        due_date, due_date_error = parse_due_date(item)
+        error = error or due_date_error
+        if error:
+            results['create'].append({'status': 'error', 'error': error})
+            continue
+        new_tasks.append({'body': body, 'due_date': due_date, 'user_id': user.id})
+        results['create'].append({'status': 'created'})
+    # The results of the created tasks, in the order of new_tasks, to be given their ids.
+    created = [result for result in results['create'] if result['status'] == 'created']
+
+    # Ownership of every task to update or delete is checked up front.
+    update_ids = [item.get('id') if isinstance(item, dict) else None for item in updates]
+    counts = Counter(task_id for task_id in update_ids + deletes if is_task_id(task_id))
+    conflicts = {task_id for task_id, count in counts.items() if count > 1}
+    owned = user.owned_task_ids(set(counts) - conflicts)
+
+    new_due_dates = []
+    for item, task_id in zip(updates, update_ids):
+        if is_task_id(task_id) and task_id in conflicts:
+            results['update'].append({'id': task_id, 'status': 'conflict', 'error': 'task is given more than once'})
+            continue
+        if not is_task_id(task_id) or task_id not in owned:
+            results['update'].append({'id': task_id, 'status': 'error', 'error': 'task not found'})
+            continue
+        if 'due_date' not in item:
+            results['update'].append({'id': task_id, 'status': 'error', 'error': 'due_date is required'})
+            continue
+        due_date, error = parse_due_date(item)
+        if error:
+            results['update'].append({'id': task_id, 'status': 'error', 'error': error})
+            continue
+        # As in Task.set_due_date(), the task is due a reminder for its new due date.
+        new_due_dates.append({'id': task_id, 'due_date': due_date, 'reminded_at': None,
+                              'reminder_attempts': 0})
+        results['update'].append({'id': task_id, 'status': 'updated'})
+
+    delete_ids = []
+    for task_id in deletes:
+        if is_task_id(task_id) and task_id in conflicts:
+            results['delete'].append({'id': task_id, 'status': 'conflict', 'error': 'task is given more than once'})
+            continue
+        if not is_task_id(task_id) or task_id not in owned:
+            results['delete'].append({'id': task_id, 'status': 'error', 'error': 'task not found'})
+            continue
+        delete_ids.append(task_id)
+        results['delete'].append({'id': task_id, 'status': 'deleted'})
+
+    for result, task_id in zip(created, insert_tasks(new_tasks)):
+        result['id'] = task_id
+    if new_due_dates:
+        db.session.bulk_update_mappings(Task, new_due_dates)
+    for start in range(0, len(delete_ids), 500):
+        Task.query.filter(Task.id.in_(delete_ids[start:start + 500])).delete(synchronize_session=False)
+    if new_tasks or new_due_dates or delete_ids:
+        User.touch_tasks(user.id)
+    db.session.commit()
+
+    return jsonify(results)
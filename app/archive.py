@@ -0,0 +1,32 @@
+''' Batch maintenance of the task archive, run by 'flask compact-tasks'. Completing a task moves it out of the task table (see archive_tasks() in app/models.py); this deletes old archived tasks and gives the space they took back to the database. Open tasks are never archived here, however overdue, as the archive holds completed tasks only. Every step works in batches of 'batch_size' rows, one transaction per batch, so it can run next to the web app without holding long locks. '''
+
+import datetime
+from app import db
+from app.models import ArchivedTask
+
+
+''' Delete archived tasks completed more than 'days' days ago. Returns the number deleted. '''
+def purge_archive(days, batch_size=1000):
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    total = 0
+    while True:
+        ids = [archived_id for archived_id, in db.session.query(ArchivedTask.id).filter(
+            ArchivedTask.completed < cutoff).order_by(ArchivedTask.completed).limit(batch_size)]
+        if not ids:
+            break
+        total += ArchivedTask.query.filter(ArchivedTask.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+    return total
+
+
+''' Give the space of moved and deleted rows back and refresh the planner's statistics: VACUUM the whole file on SQLite, VACUUM ANALYZE the two tables on PostgreSQL. Neither can run inside a transaction. '''
+def reclaim_space():
+    db.session.remove()
+    engine = db.engine
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as connection:
+            connection.execute('VACUUM')
+    elif engine.dialect.name == 'postgresql':
+        with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute('VACUUM ANALYZE task')
+            connection.execute('VACUUM ANALYZE task_archive')
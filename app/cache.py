@@ -0,0 +1,128 @@
+''' Cache of each user's rendered task list. Entries are keyed by (user id, version, sort mode, page), where the version is User.tasks_version, which every change to a user's tasks increments in the same transaction. So the next view after a change misses and re-renders, in every worker process, while stale entries are never read again and simply age out. '''
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+''' In-process backend holding at most 'maxsize' entries, each for at most 'ttl' seconds. When full, the least recently used entry is evicted. '''
+class LRUBackend:
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+''' Backend shared by every worker process, through a Redis server or anything with the same get()/setex() methods, e.g. a local stand-in during development. '''
+class RedisBackend:
+    def __init__(self, client, ttl=300):
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode('utf-8') if isinstance(value, bytes) else value
+
+    def set(self, key, value):
+        self.client.setex(key, self.ttl, value)
+
+
+class TaskListCache:
+    def __init__(self, app=None):
+        self.backend = None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    ''' Create the backend named by TASK_CACHE_BACKEND: 'lru', 'redis', or None to turn caching off. The 'redis' backend uses the client object in TASK_CACHE_CLIENT if there is one, e.g. a local stand-in, and otherwise connects to TASK_CACHE_URL. '''
+    def init_app(self, app):
+        backend = app.config.get('TASK_CACHE_BACKEND')
+        ttl = app.config.get('TASK_CACHE_TTL', 300)
+        if backend == 'lru':
+            self.backend = LRUBackend(app.config.get('TASK_CACHE_SIZE', 1024), ttl)
+        elif backend == 'redis':
+            client = app.config.get('TASK_CACHE_CLIENT')
+            if client is None:
+                import redis
+                client = redis.Redis.from_url(app.config['TASK_CACHE_URL'])
+            self.backend = RedisBackend(client, ttl)
+        elif backend:
+            raise ValueError(f'Unknown TASK_CACHE_BACKEND {backend!r}')
+        app.extensions['task_cache'] = self
+
+    ''' Return the cached task list for this user, version, sort mode, and page, calling render() to build and store it on a miss. '''
+    def get_or_render(self, user_id, version, sort_mode, page, render):
+        if self.backend is None:
+            return render()
+        key = f'tasks:{user_id}:{version}:{sort_mode}:{page}'
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if value is None:
+            value = render()
+            self.backend.set(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+
+''' Per-process cache of the users that Flask-Login loads on every request, so an authenticated request does not have to query the user table. An entry holds a snapshot of the few fields requests need (see CachedUser) along with the 'user_stamp' of the session that loaded it. A change to the user in this process drops the entry and gives the session a new stamp, so the next request of that session, in whichever worker process it lands, sees a stamp its cached entry does not have and loads the user again. A stamp only travels with the session that made the change, so the caller also checks each entry against the database (see load_user), which catches changes made by other processes and sessions, e.g. through the API, before they can serve a stale task list. '''
+class UserCache:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    ''' USER_LOADER is 'cached' to use this cache, or 'database' to load the user from the database on every request. '''
+    def init_app(self, app):
+        if app.config.get('USER_LOADER', 'database') == 'cached':
+            self.backend = LRUBackend(app.config.get('USER_CACHE_SIZE', 1024), app.config.get('USER_CACHE_TTL', 30))
+        app.extensions['user_cache'] = self
+
+    ''' Return the cached user for this session stamp if is_current(user) agrees it is up to date, and otherwise call load(). load() may return None for an unknown user, which is not cached. '''
+    def get_or_load(self, user_id, stamp, load, is_current):
+        entry = self.backend.get(user_id)
+        if entry is not None and entry[0] == stamp and is_current(entry[1]):
+            return entry[1]
+        user = load()
+        if user is not None:
+            self.backend.set(user_id, (stamp, user))
+        return user
+
+    ''' Drop the cached user and return a new session stamp for them. '''
+    def changed(self, user_id):
+        if self.backend is not None:
+            self.backend.delete(user_id)
+        return os.urandom(4).hex()
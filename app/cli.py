@@ -0,0 +1,108 @@
+''' Maintenance commands of the 'flask' command line, added to the app by create_app() only when it runs under the 'flask' command. Modules that only the commands need are imported inside them. '''
+
+import logging
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from app import db
+from app.models import User, Task, ArchivedTask, TASK_SORTS
+from app.export import EXPORT_FORMATS, export_tasks
+from app.importer import IMPORT_FORMATS, import_tasks
+
+
+def register(app):
+    # 'flask shell' in terminal to use python shell
+    @app.shell_context_processor
+    def make_shell_context():
+        return {'db': db, 'User': User, 'Task': Task, 'ArchivedTask': ArchivedTask}
+
+    for command in (export_tasks_command, import_tasks_command, send_reminders_command, compact_tasks_command):
+        app.cli.add_command(command)
+
+# 'flask export-tasks <username>' in terminal to stream a user's tasks to standard output or a file
+@click.command('export-tasks')
+@with_appcontext
+@click.argument('username')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='ndjson', help='Output format.')
+@click.option('--sort', 'sort_mode', type=click.Choice(list(TASK_SORTS)), help="Task order, the user's preference by default.")
+@click.option('--gzip', 'compress', is_flag=True, help='Compress the output with gzip.')
+@click.option('--batch-size', default=1000, help='Number of tasks read from the database at a time.')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='Output file, standard output by default.')
+def export_tasks_command(username, fmt, sort_mode, compress, batch_size, output):
+    ''' Export all tasks of a user. '''
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user named {username}')
+    for chunk in export_tasks(user.id, sort_mode or user.sort_mode, fmt, compress, batch_size):
+        output.write(chunk)
+
+# 'flask import-tasks <username> <file>' in terminal to add the tasks of an NDJSON or CSV file to a user's list
+@click.command('import-tasks')
+@with_appcontext
+@click.argument('username')
+@click.argument('file', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), help='Input format, from the file name by default.')
+@click.option('--chunk-size', type=int, help='Number of tasks inserted per transaction.')
+def import_tasks_command(username, file, fmt, chunk_size):
+    ''' Import tasks for a user from a file, or - for standard input. '''
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f'No user named {username}')
+    name = file.name if isinstance(file.name, str) else ''
+    compressed = name.endswith('.gz')
+    if fmt is None:
+        fmt = 'csv' if name[:-3 if compressed else None].endswith('.csv') else 'ndjson'
+    report = import_tasks(user.id, file, fmt, chunk_size or current_app.config['IMPORT_CHUNK_SIZE'], compressed)
+    for line, error in report.errors:
+        click.echo(f'line {line}: {error}' if line else error, err=True)
+    click.echo(report.summary())
+
+# 'flask send-reminders' in terminal to run the due date reminder worker; several can run at once
+@click.command('send-reminders')
+@with_appcontext
+@click.option('--once', is_flag=True, help='Send the reminders that are due and exit.')
+@click.option('--sink', help="Where reminders go: 'log', 'file:<path>', or 'smtp:<host>:<port>'. REMINDER_SINK by default.")
+def send_reminders_command(once, sink):
+    ''' Remind users of tasks that are coming due. '''
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    from app.reminders import ReminderScheduler, make_sink
+    config = current_app.config
+    try:
+        sink = make_sink(sink or config['REMINDER_SINK'], config)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--sink')
+    scheduler = ReminderScheduler(sink, 'default', config['REMINDER_BATCH_SIZE'], config['REMINDER_WORKERS'],
+                                  config['REMINDER_LEAD_DAYS'], config['REMINDER_LOOKBACK_DAYS'],
+                                  config['REMINDER_LEASE_SECONDS'], config['REMINDER_MAX_ATTEMPTS'])
+    try:
+        while True:
+            sent = scheduler.run_once()
+            if sent is None:
+                click.echo('Another worker is sending reminders, skipping this run.')
+            else:
+                stats = scheduler.stats
+                click.echo(f'Sent {sent} reminders; {stats.sent} sent and {stats.failed} failed in {stats.runs} runs, '
+                           f'{stats.reminders_per_second:.0f} reminders/s.')
+            if config['REMINDER_METRICS_FILE']:
+                scheduler.stats.write_metrics(config['REMINDER_METRICS_FILE'])
+            if once:
+                break
+            time.sleep(config['REMINDER_INTERVAL'])
+    finally:
+        sink.close()
+
+# 'flask compact-tasks' in terminal to trim the task archive and reclaim the space
+@click.command('compact-tasks')
+@with_appcontext
+@click.option('--purge-archived', 'purge_days', type=int, help='Delete archived tasks completed more than this many days ago.')
+@click.option('--batch-size', default=1000, help='Number of archived tasks deleted per transaction.')
+@click.option('--vacuum/--no-vacuum', default=True, help='Reclaim the space of deleted tasks afterwards.')
+def compact_tasks_command(purge_days, batch_size, vacuum):
+    ''' Keep the task archive to a set size and reclaim the space it took. '''
+    from app.archive import purge_archive, reclaim_space
+    if purge_days is not None:
+        click.echo(f'Deleted {purge_archive(purge_days, batch_size)} archived tasks.')
+    if vacuum:
+        reclaim_space()
+        click.echo('Reclaimed free space.')
@@ -0,0 +1,131 @@
+''' Database engine profiles, chosen with DATABASE_PROFILE. A profile holds the connection pool settings and the SQLite pragmas for one kind of process: 'web' for the gunicorn workers, which serve many short requests, and 'worker' for the 'flask' commands, which run long batches and may sit idle between them. 'default' applies nothing, leaving the library defaults: a connection opened per request and a rollback journal on SQLite.
+
+On PostgreSQL (or any other server database) the pool options are passed to the engine: pool_pre_ping tests a connection before handing it out, so one closed by the server or a proxy while idle is replaced instead of failing a request, and pool_recycle replaces connections older than that many seconds.
+
+On SQLite the pragmas are applied to every new connection. journal_mode=wal lets readers carry on while one writer commits, where the rollback journal locks the whole database, and synchronous=normal then only syncs at checkpoints, which is still safe against corruption. busy_timeout makes a writer wait for the lock instead of failing at once with "database is locked". mmap_size and cache_size (negative: KiB) let reads come from memory. These last only as long as the connection, so a profile also keeps a pool of open connections rather than opening one per request. A value set in SQLALCHEMY_ENGINE_OPTIONS still overrides the profile.
+
+Read replica. When SQLALCHEMY_BINDS has a 'replica' bind, the session routes the queries of read-only views (those marked with @reads_from_replica) and of 'with db.replica_reads():' blocks to it, and everything else to the primary. A session that has written anything reads from the primary from then on, so a request reads its own writes. A replica copies the primary with some delay, so after a request of a user writes, their browser session is kept on the primary for REPLICA_STICKY_SECONDS, long enough for the replica to catch up. '''
+
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import partial
+from flask import current_app, has_request_context, request, session
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import event, orm
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.dml import UpdateBase
+
+EngineProfile = namedtuple('EngineProfile', ['pool', 'pragmas'])
+
+# The busy timeout comes first, so that switching the journal mode waits for other connections.
+ENGINE_PROFILES = {
+    'default': EngineProfile(pool={}, pragmas=()),
+    'web': EngineProfile(
+        pool={'pool_size': 5, 'max_overflow': 5, 'pool_timeout': 10, 'pool_pre_ping': True, 'pool_recycle': 1800},
+        pragmas=(('busy_timeout', 5000), ('journal_mode', 'wal'), ('synchronous', 'normal'),
+                 ('mmap_size', 256 * 1024 * 1024), ('cache_size', -16000))),
+    'worker': EngineProfile(
+        pool={'pool_size': 2, 'max_overflow': 2, 'pool_timeout': 30, 'pool_pre_ping': True, 'pool_recycle': 1800},
+        pragmas=(('busy_timeout', 30000), ('journal_mode', 'wal'), ('synchronous', 'normal'),
+                 ('mmap_size', 256 * 1024 * 1024), ('cache_size', -64000))),
+}
+
+REPLICA_BIND = 'replica'
+
+# The pool options that apply to a pool of SQLite connections. SQLAlchemy opens a new connection per use for SQLite files otherwise.
+SQLITE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+def engine_profile(name):
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"unknown database profile {name!r}, expected one of {', '.join(ENGINE_PROFILES)}")
+    return ENGINE_PROFILES[name]
+
+
+def set_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas:
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+
+''' Mark a view as read-only, so that its GET requests may read from the replica. '''
+def reads_from_replica(view):
+    view.reads_from_replica = True
+    return view
+
+
+''' Whether the current request may read from the replica: a GET of a view marked with @reads_from_replica, outside the sticky window of the browser session's last write. '''
+def replica_request():
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'reads_from_replica', False) and session.get('primary_until', 0) <= time.time()
+
+
+''' Session that sends reads to the replica bind where allowed, see the module docstring. 'replica' is None to decide by the request, or True inside db.replica_reads(). '''
+class RoutingSession(SignallingSession):
+    def __init__(self, db, **options):
+        self._db = db
+        self.replica = None
+        self.wrote = False
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or isinstance(clause, UpdateBase):
+            self.wrote = True
+        elif not self.wrote and REPLICA_BIND in (self.app.config['SQLALCHEMY_BINDS'] or ()):
+            if self.replica or (self.replica is None and replica_request()):
+                return self._db.get_engine(self.app, bind=REPLICA_BIND)
+        return super().get_bind(mapper, clause)
+
+
+''' Flask-SQLAlchemy with the engine options of the app's DATABASE_PROFILE. Every engine of the app, including those of SQLALCHEMY_BINDS, gets them. '''
+class Database(SQLAlchemy):
+    def apply_driver_hacks(self, app, sa_url, options):
+        profile = engine_profile(app.config.get('DATABASE_PROFILE', 'default'))
+        if sa_url.drivername.startswith('sqlite'):
+            if profile.pragmas and sa_url.database not in (None, '', ':memory:'):
+                options['poolclass'] = QueuePool
+                options.update({key: profile.pool[key] for key in SQLITE_POOL_OPTIONS if key in profile.pool})
+                # Pooled connections are used by one thread at a time, but not always the thread that opened them.
+                options.setdefault('connect_args', {})['check_same_thread'] = False
+            # Picked up by create_engine() below.
+            options['sqlite_pragmas'] = profile.pragmas
+        else:
+            options.update(profile.pool)
+        super().apply_driver_hacks(app, sa_url, options)
+
+    def create_engine(self, sa_url, engine_opts):
+        pragmas = engine_opts.pop('sqlite_pragmas', ())
+        engine = super().create_engine(sa_url, engine_opts)
+        if pragmas:
+            event.listen(engine, 'connect', partial(set_pragmas, pragmas))
+        return engine
+
+    def init_app(self, app):
+        app.config.setdefault('REPLICA_STICKY_SECONDS', 10)
+        app.after_request(self.stick_to_primary)
+        super().init_app(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    ''' Let the queries in the block read from the replica, e.g. checks whose answer is confirmed by a constraint on write. '''
+    @contextmanager
+    def replica_reads(self):
+        routing_session = self.session()
+        previous = routing_session.replica
+        routing_session.replica = True
+        try:
+            yield
+        finally:
+            routing_session.replica = previous
+
+    ''' After a request that wrote, read the browser session's next requests from the primary for REPLICA_STICKY_SECONDS. '''
+    def stick_to_primary(self, response):
+        if (self.session.registry.has() and self.session().wrote and
+                REPLICA_BIND in (current_app.config['SQLALCHEMY_BINDS'] or ())):
+            session['primary_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+        return response
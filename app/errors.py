@@ -1,13 +1,20 @@
 ''' Route functions to define custom error pages to supersede default error pages. These render custom templates that are defined in the /templates folder. '''
 
-from flask import render_template
-from app import app, db
+from flask import Blueprint, render_template
+from app import db
 
-@app.errorhandler(404)
+bp = Blueprint('errors', __name__)
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('404.html'), 404
 
-@app.errorhandler(500)
+# Too many sign-in attempts, see app/ratelimit.py. Retry-After tells the client when to try again.
+@bp.app_errorhandler(429)
+def too_many_requests_error(error):
+    return render_template('429.html'), 429, {'Retry-After': str(getattr(error, 'retry_after', 60))}
+
+@bp.app_errorhandler(500)
 def internal_error(error):
     ''' 500 error could be thrown after a database error. Issue a session rollback to ensure any failed database sessions do not interfere with any database accesses triggered by the template. This resets the session to a clean state. '''
     db.session.rollback()
@@ -0,0 +1,73 @@
+''' Streaming export of a user's tasks as NDJSON (one JSON object per line) or CSV, optionally gzip compressed. Everything here is a generator: tasks are read from the database in batches of 'batch_size' through a server-side cursor where the database supports one, encoded, and handed on in chunks of about CHUNK_SIZE bytes, so memory use stays flat however many tasks there are. '''
+
+import csv
+import io
+import json
+import zlib
+from app.models import Task, TASK_SORTS, iter_sorted_tasks
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+CSV_FIELDS = ['id', 'body', 'timestamp', 'due_date']
+CHUNK_SIZE = 64 * 1024
+
+# Content type of each export format.
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+
+''' Iterate over a user's tasks in the given sort order ('newest', 'oldest', or 'due_date'). '''
+def iter_tasks(user_id, sort_mode, batch_size=1000):
+    query = Task.query.filter_by(user_id=user_id).execution_options(stream_results=True).yield_per(batch_size)
+    return iter_sorted_tasks(query, TASK_SORTS[sort_mode])
+
+
+def ndjson_lines(tasks):
+    for task in tasks:
+        yield json.dumps(task.to_dict()) + '\n'
+
+
+def csv_lines(tasks):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, CSV_FIELDS)
+    writer.writeheader()
+    for task in tasks:
+        writer.writerow(task.to_dict())
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+''' Join short strings into UTF-8 chunks of about 'size' bytes, so a response is not written one line at a time. '''
+def buffered(lines, size=CHUNK_SIZE):
+    parts = []
+    length = 0
+    for line in lines:
+        parts.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(parts).encode('utf-8')
+            parts = []
+            length = 0
+    if parts:
+        yield ''.join(parts).encode('utf-8')
+
+
+''' Compress a stream of byte chunks into a gzip file on the fly. '''
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+''' The bytes of an export of a user's tasks, as a generator. '''
+def export_tasks(user_id, sort_mode, fmt, compress=False, batch_size=1000):
+    tasks = iter_tasks(user_id, sort_mode, batch_size)
+    lines = ndjson_lines(tasks) if fmt == 'ndjson' else csv_lines(tasks)
+    chunks = buffered(lines)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def export_filename(fmt, compress=False):
+    return f'tasks.{fmt}' + ('.gz' if compress else '')
@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField
+from flask_wtf.file import FileField, FileRequired
+from wtforms import StringField, PasswordField, BooleanField, SubmitField, TextAreaField, SelectField
 from wtforms.fields.html5 import DateField # wtforms html5 contains pop up calendar display
 from wtforms.validators import ValidationError, DataRequired, Email, EqualTo, Length
 
@@ -45,3 +46,17 @@ class DueDateForm(FlaskForm):
     ''' The DateField generates a pop up calendar which the user can select a date from or manually enter a date. This date gets sent as a POST request as a datetime.date object in the form 'YYYY-MM-DD'. If a user manually enters a date I expect it to be in the form MM/DD/YYYY, so the format argument will get the user input MM/DD/YYYY and set it to YYYY-MM-DD before the POST request to avoid errors. '''
     due_date = DateField('Enter Due Date:', format='%Y-%m-%d')
     submit = SubmitField('Submit')
+
+''' Import Form includes a file field for an NDJSON or CSV file of tasks, as written by the export, which may be gzip compressed, and a submit button. '''
+class ImportForm(FlaskForm):
+    file = FileField('Tasks File', validators=[FileRequired()])
+    format = SelectField('Format', choices=[('ndjson', 'NDJSON'), ('csv', 'CSV')])
+    submit = SubmitField('Import')
+
+''' Search Form includes a field for the words to search task bodies for and a submit button. It is sent with GET so a search has its own URL, and so needs no CSRF token. '''
+class SearchForm(FlaskForm):
+    class Meta:
+        csrf = False
+
+    q = StringField('Search Tasks', validators=[DataRequired(), Length(max=200)])
+    submit = SubmitField('Search')
@@ -0,0 +1,122 @@
+''' Password hashing with werkzeug, with the method and iteration count taken from the configuration and a cap on how many hashes run at once. PBKDF2 is deliberately slow, so a burst of logins could otherwise keep every CPU busy hashing while task list requests wait. A hash first takes one of PASSWORD_HASH_MAX_CONCURRENT slots, and a request that cannot get one within PASSWORD_HASH_TIMEOUT seconds gets HashingBusy instead of queueing without bound.
+
+The cap is meant for the Procfile's deployment: sync gunicorn workers on one machine, each serving one request at a time. There the slots are lock files in PASSWORD_HASH_SLOTS_DIR, shared by all the worker processes, so however many workers take logins at once, at most that many of them hash and the rest answer their logins at once instead of waiting behind the others. A lock is dropped by the system when its process dies, so a killed worker does not keep its slot. Without PASSWORD_HASH_SLOTS_DIR (or without fcntl, e.g. on Windows) the slots are a semaphore in each process, which only caps the threads of one worker, e.g. with gunicorn's gthread workers and a cap below the thread count.
+
+Hashes run on the request thread, or on a small thread or process pool with PASSWORD_HASH_EXECUTOR. A sync worker waits for the pool's result all the same, so a pool only helps a threaded worker whose other threads serve requests in the meantime. '''
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# How often a request waiting for a file slot tries the slots again.
+SLOT_POLL_INTERVAL = 0.01
+
+
+class HashingBusy(Exception):
+    pass
+
+
+''' Slots in one process, taken by its threads. '''
+class ThreadSlots:
+    def __init__(self, count):
+        self._semaphore = threading.BoundedSemaphore(count)
+
+    ''' Returns a token for release(), or None if no slot freed up within 'timeout' seconds. '''
+    def acquire(self, timeout):
+        return True if self._semaphore.acquire(timeout=timeout) else None
+
+    def release(self, token):
+        self._semaphore.release()
+
+
+''' Slots shared by every process on the machine: one lock file per slot in 'directory', taken with an exclusive flock(). Each attempt opens the file anew, and locks on separate opens exclude each other, so threads of one process take separate slots too. '''
+class FileSlots:
+    def __init__(self, directory, count):
+        os.makedirs(directory, exist_ok=True)
+        self.paths = [os.path.join(directory, f'slot-{number}.lock') for number in range(count)]
+
+    def _try_acquire(self):
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def acquire(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            fd = self._try_acquire()
+            if fd is not None or (deadline is not None and time.monotonic() >= deadline):
+                return fd
+            time.sleep(SLOT_POLL_INTERVAL)
+
+    # Closing the file drops its lock.
+    def release(self, fd):
+        os.close(fd)
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256:150000'
+        self.salt_length = 8
+        self.executor_class = None
+        self.workers = 1
+        self.timeout = None
+        self._executor = None
+        self._slots = ThreadSlots(1)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        method = app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256')
+        iterations = app.config.get('PASSWORD_HASH_ITERATIONS')
+        # Stored hashes start with the full method, e.g. 'pbkdf2:sha256:150000$', which needs_rehash() compares against.
+        self.method = f'{method}:{iterations}' if method.startswith('pbkdf2') and iterations else method
+        self.salt_length = app.config.get('PASSWORD_SALT_LENGTH', 8)
+        self.executor_class = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}.get(
+            app.config.get('PASSWORD_HASH_EXECUTOR'))
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 1)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT')
+        count = app.config.get('PASSWORD_HASH_MAX_CONCURRENT', self.workers)
+        directory = app.config.get('PASSWORD_HASH_SLOTS_DIR')
+        self._slots = FileSlots(directory, count) if directory and fcntl else ThreadSlots(count)
+        app.extensions['password_hasher'] = self
+
+    ''' The pool is only started on first use, so a process that never hashes, e.g. a CLI command or a preloading parent process, does not start one. '''
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.executor_class(max_workers=self.workers)
+            return self._executor
+
+    def _run(self, function, *args):
+        slot = self._slots.acquire(self.timeout)
+        if slot is None:
+            raise HashingBusy()
+        try:
+            if self.executor_class is None:
+                return function(*args)
+            return self._get_executor().submit(function, *args).result()
+        finally:
+            self._slots.release(slot)
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def check(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    ''' True if a stored hash was made with another method or iteration count than the configured one. '''
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
@@ -0,0 +1,156 @@
+''' Bulk import of tasks from NDJSON or CSV, the formats written by app/export.py. The input is read as a stream, each row is validated like a task created through the API (a body of at most 140 characters and an optional YYYY-MM-DD due date), and valid rows are inserted in chunks, one transaction per chunk. On PostgreSQL a chunk is sent with COPY, elsewhere with a single executemany INSERT. A chunk that fails is rolled back and reported, and the import carries on with the next one. '''
+
+import csv
+import datetime
+import gzip
+import io
+import json
+import time
+from sqlalchemy.exc import SQLAlchemyError
+from app import db
+from app.api import parse_body, parse_due_date
+from app.models import User, Task
+
+IMPORT_FORMATS = ('ndjson', 'csv')
+
+# Only the first errors are kept in a report, so a bad file cannot use up memory.
+MAX_REPORTED_ERRORS = 100
+
+# Timestamps as written by Task.to_dict(), with and without microseconds.
+TIMESTAMP_FORMATS = ('%Y-%m-%dT%H:%M:%S.%fZ', '%Y-%m-%dT%H:%M:%SZ')
+
+
+class ImportReport:
+    def __init__(self):
+        self.read = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    ''' Record a failure of 'count' rows, starting at input line 'line'. '''
+    def error(self, line, message, count=1):
+        self.failed += count
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    @property
+    def rows_per_second(self):
+        return self.imported / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f'{self.imported} of {self.read} tasks imported, {self.failed} failed, '
+                f'in {self.elapsed:.2f}s ({self.rows_per_second:.0f} tasks/s)')
+
+
+''' Iterate over (line number, row, error) for each record of a binary stream, where row is a dict and error is None, or the other way round. '''
+def read_rows(stream, fmt, compressed=False):
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if fmt == 'ndjson':
+        for line_number, line in enumerate(text, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None, 'invalid JSON'
+                continue
+            if isinstance(row, dict):
+                yield line_number, row, None
+            else:
+                yield line_number, None, 'row must be a JSON object'
+    else:
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Empty CSV cells mean no value.
+            yield reader.line_num, {key: value or None for key, value in row.items()}, None
+
+
+def parse_timestamp(row):
+    value = row.get('timestamp')
+    if value is None:
+        return None, None
+    for timestamp_format in TIMESTAMP_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, timestamp_format), None
+        except (TypeError, ValueError):
+            pass
+    return None, 'timestamp must be in the form YYYY-MM-DDTHH:MM:SS.ffffffZ'
+
+
+''' Validate one row, returning (mapping for the task table, error). A missing body in CSV is an empty task, as from the task form. '''
+def validate_row(row, user_id, now):
+    if 'body' in row and row['body'] is None:
+        row['body'] = ''
+    body, error = parse_body(row)
+    due_date, due_date_error = parse_due_date(row)
+    timestamp, timestamp_error = parse_timestamp(row)
+    error = error or due_date_error or timestamp_error
+    if error:
+        return None, error
+    return {'body': body, 'timestamp': timestamp or now, 'user_id': user_id, 'due_date': due_date}, None
+
+
+''' Send a chunk of task rows to PostgreSQL with COPY, which is much faster than INSERT for large imports. '''
+def copy_chunk(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row['body'], row['timestamp'].isoformat(), row['user_id'],
+                         row['due_date'].isoformat() if row['due_date'] else ''])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert('COPY task (body, timestamp, user_id, due_date) FROM STDIN '
+                       'WITH (FORMAT csv, FORCE_NOT_NULL (body))', buffer)
+
+
+''' Insert one chunk and commit it, or roll it back and report it. COPY runs on the driver's cursor, so its errors are the driver's own rather than SQLAlchemy's; rolling back also ends the transaction PostgreSQL aborted for them. '''
+def insert_chunk(rows, first_line, user_id, report, use_copy):
+    try:
+        if use_copy:
+            copy_chunk(rows)
+        else:
+            db.session.bulk_insert_mappings(Task, rows)
+        User.touch_tasks(user_id)
+        db.session.commit()
+        report.imported += len(rows)
+    except (SQLAlchemyError, db.session.get_bind().dialect.dbapi.Error) as e:
+        db.session.rollback()
+        report.error(first_line, f'chunk of {len(rows)} tasks failed: {e.__class__.__name__}', len(rows))
+
+
+''' Import tasks for a user from a binary stream of NDJSON or CSV, 'chunk_size' tasks per transaction. Returns an ImportReport. '''
+def import_tasks(user_id, stream, fmt, chunk_size=1000, compressed=False):
+    report = ImportReport()
+    use_copy = db.session.get_bind().dialect.name == 'postgresql'
+    now = datetime.datetime.utcnow()
+    chunk = []
+    first_line = None
+    rows = read_rows(stream, fmt, compressed)
+    try:
+        for line_number, row, error in rows:
+            report.read += 1
+            if row is not None:
+                row, error = validate_row(row, user_id, now)
+            if error:
+                report.error(line_number, error)
+                continue
+            if not chunk:
+                first_line = line_number
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                insert_chunk(chunk, first_line, user_id, report, use_copy)
+                chunk = []
+    except (UnicodeDecodeError, csv.Error, OSError) as e:
+        # The rest of the input cannot be read; keep what was read so far.
+        report.error(None, f'input could not be read: {e}')
+    if chunk:
+        insert_chunk(chunk, first_line, user_id, report, use_copy)
+    return report.finish()
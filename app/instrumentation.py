@@ -0,0 +1,188 @@
+''' Opt-in request instrumentation, turned on with INSTRUMENTATION_ENABLED. For every request it counts and times the SQL statements run (through SQLAlchemy engine events) and the templates rendered, and adds the totals to the response as a Server-Timing header, which browser developer tools display. Requests slower than SLOW_REQUEST_THRESHOLD seconds are logged with their statements. Per-endpoint histograms of request duration and query count are served in Prometheus text format at /metrics, to requests that send METRICS_TOKEN as a bearer token. '''
+
+import bisect
+import hmac
+import logging
+import threading
+import time
+from flask import Response, abort, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, for durations in seconds and for numbers of queries.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Statements kept per request for the slow request log.
+MAX_LOGGED_STATEMENTS = 50
+
+
+''' Cumulative histogram over fixed buckets, as Prometheus expects. Quantiles are estimated by linear interpolation inside the bucket they fall in, like Prometheus' histogram_quantile(). '''
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+''' Timings of the request being handled, kept in g. '''
+class RequestTimings:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.statements = []
+
+
+def current_timings():
+    return g.get('_timings') if has_request_context() else None
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timings() is not None:
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    if timings is None or not conn.info.get('query_start'):
+        return
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    timings.queries += 1
+    timings.query_time += elapsed
+    if len(timings.statements) < MAX_LOGGED_STATEMENTS:
+        timings.statements.append((elapsed, statement))
+
+
+''' Jinja template class that adds its rendering time to the request's timings. Included templates are rendered inside their parent's render() and so are counted once. '''
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            timings = current_timings()
+            if timings is not None:
+                timings.template_time += time.perf_counter() - start
+
+
+class Instrumentation:
+    # Engine events are registered once per process, for every engine, and only record inside a request.
+    _engine_events = False
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.slow_threshold = None
+        self.token = None
+        self.durations = {}
+        self.query_counts = {}
+        self.counters = []
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['instrumentation'] = self
+        self.enabled = bool(app.config.get('INSTRUMENTATION_ENABLED'))
+        if not self.enabled:
+            return
+        self.slow_threshold = app.config.get('SLOW_REQUEST_THRESHOLD')
+        self.token = app.config.get('METRICS_TOKEN')
+        if not Instrumentation._engine_events:
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+            Instrumentation._engine_events = True
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self.before_request)
+        app.after_request(self.after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics)
+
+    ''' Add counters from another part of the app to /metrics. 'stats' returns a dict of counter names and values, which are exported as <prefix>_<name>_total. '''
+    def add_counters(self, prefix, stats, description):
+        self.counters.append((prefix, stats, description))
+
+    def before_request(self):
+        g._timings = RequestTimings()
+
+    def after_request(self, response):
+        timings = g.pop('_timings', None)
+        if timings is None:
+            return response
+        total = time.perf_counter() - timings.start
+        response.headers['Server-Timing'] = (
+            f'db;dur={timings.query_time * 1000:.1f};desc="{timings.queries} queries", '
+            f'tpl;dur={timings.template_time * 1000:.1f}, total;dur={total * 1000:.1f}')
+
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            if endpoint not in self.durations:
+                self.durations[endpoint] = Histogram(DURATION_BUCKETS)
+                self.query_counts[endpoint] = Histogram(QUERY_BUCKETS)
+            self.durations[endpoint].observe(total)
+            self.query_counts[endpoint].observe(timings.queries)
+
+        if self.slow_threshold is not None and total > self.slow_threshold:
+            statements = ''.join(f'\n  {elapsed * 1000:.1f} ms: {statement}' for elapsed, statement in timings.statements)
+            logger.warning('Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, templates %.1f ms%s',
+                           request.method, request.path, endpoint, total * 1000, timings.queries,
+                           timings.query_time * 1000, timings.template_time * 1000, statements)
+        return response
+
+    ''' Prometheus text exposition of the per-endpoint histograms, their p50/p95/p99 estimates, and the registered counters. '''
+    def metrics(self):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if not self.token or scheme.lower() != 'bearer' or not hmac.compare_digest(token, self.token):
+            abort(403)
+
+        lines = []
+        with self._lock:
+            for name, description, histograms in (
+                    ('todo_request_duration_seconds', 'Time to handle a request.', self.durations),
+                    ('todo_request_queries', 'SQL statements run by a request.', self.query_counts)):
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for endpoint, histogram in sorted(histograms.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ('+Inf',), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.sum}')
+                    lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram.count}')
+                lines.append(f'# HELP {name}_estimate Quantiles of {name} estimated from its histogram.')
+                lines.append(f'# TYPE {name}_estimate gauge')
+                for endpoint, histogram in sorted(histograms.items()):
+                    for q in QUANTILES:
+                        lines.append(f'{name}_estimate{{endpoint="{endpoint}",quantile="{q}"}} {histogram.quantile(q)}')
+
+        for prefix, stats, description in self.counters:
+            for key, value in sorted(stats().items()):
+                lines.append(f'# HELP {prefix}_{key}_total {description}')
+                lines.append(f'# TYPE {prefix}_{key}_total counter')
+                lines.append(f'{prefix}_{key}_total {value}')
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
@@ -1,88 +1,400 @@
-from datetime import datetime
-from app import db, login
-from werkzeug.security import generate_password_hash, check_password_hash
+import secrets
+from collections import namedtuple
+from datetime import datetime, date, timedelta
+from flask import current_app, has_request_context, session
+from sqlalchemy import tuple_, literal, select
+from app import db, login, hasher, user_cache
 from flask_login import UserMixin
 
-''' User model includes primary key id, username, email, hashed password, task relationship variable to reference a user's tasks, and three boolean variables to indicate the display of a user's tasks.
+# The orders a user can view their tasks in. A user's choice is stored in User.task_sort as its position in this tuple.
+SORT_MODES = ('newest', 'oldest', 'due_date')
+
+''' Task queries of a user. They only need the user's id and sort preference, so they work the same on a User loaded from the database and on the CachedUser kept by the user loader. '''
+class TaskOwnerMixin:
+    ''' Name of the user's preference to view their tasks by: 'newest', 'oldest', or 'due_date'. This is the key into TASK_SORTS. '''
+    @property
+    def sort_mode(self):
+        return SORT_MODES[self.task_sort or 0]
+
+    ''' Set the user's preference to view their tasks by, with a single UPDATE that needs no loaded User. Nothing is written when the preference is already 'sort_mode'. Returns True if it changed, in which case the caller commits. The task list needs no new version, as the sort mode is part of its cache key and ETag. '''
+    def set_sort_mode(self, sort_mode):
+        value = SORT_MODES.index(sort_mode)
+        if value == self.task_sort:
+            return False
+        User.query.filter_by(id=self.id).update({User.task_sort: value}, synchronize_session='evaluate')
+        self.task_sort = value
+        User.changed(self.id)
+        return True
+
+    ''' Get one page of the user's tasks in their preferred order. 'after' and 'before' are cursors taken from a previous TaskPage; with neither the first page is returned. '''
+    def get_page_of_tasks(self, after=None, before=None, per_page=None):
+        per_page = per_page or current_app.config['TASKS_PER_PAGE']
+        user_tasks = Task.query.filter_by(user_id=self.id)
+        return paginate_tasks(user_tasks, TASK_SORTS[self.sort_mode], per_page, after=after, before=before)
+
+    ''' Get all of the user's tasks in their preferred order. Tasks without a due date are sorted last by the database itself (see TASK_SORTS), so each part of the order is read straight off an index. '''
+    def get_sorted_view_of_tasks(self):
+        user_tasks = Task.query.filter_by(user_id=self.id)
+        return list(iter_sorted_tasks(user_tasks, TASK_SORTS[self.sort_mode]))
+
+    ''' Get one page of the user's tasks due on or after 'start' and before 'end', by due date. A 'start' of None means every day before 'end'. The range is a single scan of the (user_id, due_date, id) index, and 'after' and 'before' are cursors as in get_page_of_tasks(). '''
+    def get_page_of_tasks_due(self, start, end, after=None, before=None, per_page=None):
+        per_page = per_page or current_app.config['TASKS_PER_PAGE']
+        return paginate_tasks(self._tasks_due(Task.query, start, end), TASK_SORTS['due_date'][:1], per_page,
+                              after=after, before=before)
+
+    ''' Number of the user's tasks due on each day on or after 'start' and before 'end', as a dict of date to count, with one GROUP BY query that only reads the (user_id, due_date, id) index. Days without tasks are left out. '''
+    def count_tasks_due_by_day(self, start, end):
+        counts = db.session.query(Task.due_date, db.func.count(Task.id)).group_by(Task.due_date)
+        return dict(self._tasks_due(counts, start, end))
+
+    def _tasks_due(self, query, start, end):
+        query = query.filter(Task.user_id == self.id, Task.due_date < end)
+        return query if start is None else query.filter(Task.due_date >= start)
+
+    ''' Get one page of the user's completed tasks, most recently completed first. 'after' and 'before' are cursors as in get_page_of_tasks(). '''
+    def get_page_of_archived_tasks(self, after=None, before=None, per_page=None):
+        per_page = per_page or current_app.config['TASKS_PER_PAGE']
+        archived = ArchivedTask.query.filter_by(user_id=self.id)
+        return paginate_tasks(archived, ARCHIVE_SORT, per_page, after=after, before=before)
+
+    ''' Get the user's task with the given id, or None if there is no such task or it belongs to another user. '''
+    def get_task(self, task_id):
+        return Task.query.filter_by(id=task_id, user_id=self.id).first()
+
+    ''' Of the given task ids, return the set of those that belong to this user, checked with one query per chunk of ids to stay under the database's limit on bound parameters. '''
+    def owned_task_ids(self, task_ids, chunk_size=500):
+        task_ids = list(task_ids)
+        owned = set()
+        for start in range(0, len(task_ids), chunk_size):
+            chunk = task_ids[start:start + chunk_size]
+            owned.update(task_id for task_id, in db.session.query(Task.id).filter(
+                Task.user_id == self.id, Task.id.in_(chunk)))
+        return owned
+
+''' User model includes primary key id, username, email, hashed password, task relationship variable to reference a user's tasks, and a small integer to indicate the display of a user's tasks (see SORT_MODES).
 
 To work with Flask-Login (a user session management extension for Flask) the User class needs to implement a few properties and methods: is_authenticated, is_active, is_anonymous, and get_id(). Flask-Login provides the UserMixin class which provides default implementations of these. The User class will inherit from UserMixin.
 '''
-class User(UserMixin, db.Model):
+class User(UserMixin, TaskOwnerMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
-    password_hash = db.Column(db.String(128))
+    password_hash = db.Column(db.String(256))
     # 'tasks' is a references the class 'Task'
     tasks = db.relationship('Task', backref='author', lazy='dynamic')
-    view_tasks_by_newest = db.Column(db.Boolean, default=True)
-    view_tasks_by_oldest = db.Column(db.Boolean, default=False)
-    view_tasks_by_due_date = db.Column(db.Boolean, default=False)
+    task_sort = db.Column(db.SmallInteger, nullable=False, default=0, server_default='0')
+    # Version and time of the last change to the user's tasks or their sort preference, see touch_tasks().
+    tasks_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tasks_modified = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bearer token for the JSON API, see get_token().
+    token = db.Column(db.String(32), index=True, unique=True)
+    token_expiration = db.Column(db.DateTime)
 
     def __repr__(self):
         return f'<User {self.username}>'
 
+    ''' Password hashing goes through the app's PasswordHasher, which uses the configured method and caps concurrent hashes. Both methods raise HashingBusy when no hashing slot frees up in time. '''
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return hasher.check(self.password_hash, password)
 
-    ''' Get the user's preference to view their tasks by newest, oldest, or due date. '''
-    def get_sorted_view_of_tasks(self):
-        # user_tasks is a Task object type, and all() converts the object to List type
-        user_tasks = Task.query.filter_by(user_id=self.id)
-        if self.view_tasks_by_newest:
-            return user_tasks.order_by(Task.timestamp.desc()).all()
-        elif self.view_tasks_by_oldest:
-            return user_tasks.order_by(Task.timestamp).all()
-        elif self.view_tasks_by_due_date:
-            ''' Here the user selected to view tasks by due date, which will display tasks in the order they are due, starting with the earliest due date. When a Task is instantiated the due_date field is set to None by default, and None is less than any datetime.date, so when the tasks are sorted by the database the tasks with due dates equal to None are displayed before the tasks with actual due dates. To correct this, when the list of tasks is queried a custom sorting algorithm is used to push all the tasks with due dates to the front of the list and push all the tasks with None due dates to the end of the list. In-place, linear sort. '''
-
-            tasks = user_tasks.order_by(Task.due_date).all() # here tasks is unsorted list
-            left = 0
-            right = 0
-            ''' start with left and right variables at first index of list, traverse with right as leader and left as follower until right reaches a task with a due date, then swap left with right and continue until right reaches the end of the list '''
-            while right < len(tasks):
-                if tasks[right].due_date == None:
-                    right += 1
-                else:
-                    tasks[left], tasks[right] = tasks[right], tasks[left]
-                    left += 1
-                    right += 1
-            return tasks
-
-    ''' Set the user's preference to view their tasks by newest, oldest, or due date. '''
-    def set_sorted_view_of_tasks(self, view_by_newest, view_by_oldest, view_by_due_date):
-        if view_by_newest:
-            self.view_tasks_by_newest = True
-            self.view_tasks_by_oldest = False
-            self.view_tasks_by_due_date = False
-        elif view_by_oldest:
-            self.view_tasks_by_oldest = True
-            self.view_tasks_by_newest = False
-            self.view_tasks_by_due_date = False
-        elif view_by_due_date:
-            self.view_tasks_by_due_date = True
-            self.view_tasks_by_newest = False
-            self.view_tasks_by_oldest = False
-
-''' Task model includes primary key id, to-do task body, timestamp which is indexed to efficiently retrieve to-do's in chronological order, a user_id variable which is set to the id of the user who created this task, and a due date. '''
+    ''' Check the password, and if it is right but the stored hash is outdated, replace it with one made with the current method and iteration count. The caller commits. '''
+    def check_and_upgrade_password(self, password):
+        if not self.check_password(password):
+            return False
+        if hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
+
+    ''' Find the user with this username or e-mail address in one query over the two unique indexes. If one user's username is another user's e-mail address, the username wins, as it is the more specific match. '''
+    @staticmethod
+    def find_by_login(name):
+        return User.query.filter((User.username == name) | (User.email == name)).order_by(
+            (User.username == name).desc()).first()
+
+    ''' Return the user's API token, issuing a new one if there is none or it expires within a minute. The caller commits. '''
+    def get_token(self, expires_in=3600):
+        now = datetime.utcnow()
+        if self.token and self.token_expiration > now + timedelta(seconds=60):
+            return self.token
+        self.token = secrets.token_hex(16)
+        self.token_expiration = now + timedelta(seconds=expires_in)
+        return self.token
+
+    def revoke_token(self):
+        self.token_expiration = datetime.utcnow() - timedelta(seconds=1)
+
+    ''' Get the user with this API token, or None if the token is unknown or expired. '''
+    @staticmethod
+    def check_token(token):
+        user = User.query.filter_by(token=token).first()
+        if user is None or user.token_expiration < datetime.utcnow():
+            return None
+        return user
+
+    ''' Record that a user's to-do list changed, in the current transaction. The version is incremented by the database rather than in Python so concurrent changes are never lost. It is used as the ETag of the task list and as part of the TaskListCache key. '''
+    @staticmethod
+    def touch_tasks(user_id):
+        User.query.filter_by(id=user_id).update(
+            {User.tasks_version: User.tasks_version + 1, User.tasks_modified: datetime.utcnow()},
+            synchronize_session=False)
+        User.changed(user_id)
+
+    ''' Tell the user loader that this user changed, so their next request loads them from the database again. '''
+    @staticmethod
+    def changed(user_id):
+        stamp = user_cache.changed(user_id)
+        if has_request_context() and session.get('_user_id') == str(user_id):
+            session['user_stamp'] = stamp
+
+''' Task model includes primary key id, to-do task body, timestamp which is indexed to efficiently retrieve to-do's in chronological order, a user_id variable which is set to the id of the user who created this task, and a due date.
+
+A user's tasks are always read filtered by user_id and ordered by (timestamp, id) or (due_date, id), so the first two composite indexes below let the database find and order them with a single index range scan. '''
 class Task(db.Model):
+    __table_args__ = (
+        db.Index('ix_task_user_id_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_task_user_id_due_date_id', 'user_id', 'due_date', 'id'),
+        # Only the tasks not reminded yet, by due date, for the reminder scan (see app/reminders.py).
+        db.Index('ix_task_unreminded_due_date_id', 'due_date', 'id',
+                 postgresql_where=db.text('reminded_at IS NULL'), sqlite_where=db.text('reminded_at IS NULL')),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.String(140))
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     # The 'user' in the user.id argument refers to the User model table name
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    due_date = db.Column(db.Date, index=True)
+    due_date = db.Column(db.Date)
+    # When the due date reminder was sent, or None if it has not been.
+    reminded_at = db.Column(db.DateTime)
+    # Failed attempts to deliver the reminder; it is given up after REMINDER_MAX_ATTEMPTS.
+    reminder_attempts = db.Column(db.SmallInteger, nullable=False, default=0, server_default='0')
 
     def __repr__(self):
         return f'<Task {self.body}>'
 
+    ''' Setting a due date, even the same one again, makes the task due a reminder for it. '''
     def set_due_date(self, date):
         self.due_date = date
+        self.reminded_at = None
+        self.reminder_attempts = 0
+
+    ''' JSON representation used by the API. '''
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'body': self.body,
+            'timestamp': self.timestamp.isoformat() + 'Z' if self.timestamp else None,
+            'due_date': self.due_date.isoformat() if self.due_date else None,
+        }
+
+''' Archived Task model holds completed tasks. Completing a task moves its row here from the task table (see archive_tasks()), so the task table and its indexes only hold open tasks and a user's to-do list does not slow down as finished tasks pile up. An archived task keeps its body, timestamp, and due date, and records when it was completed. Task ids can be reused by SQLite once their row is gone, so archived tasks have ids of their own. '''
+class ArchivedTask(db.Model):
+    __tablename__ = 'task_archive'
+    __table_args__ = (
+        db.Index('ix_task_archive_user_id_completed_id', 'user_id', 'completed', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    body = db.Column(db.String(140))
+    timestamp = db.Column(db.DateTime)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    due_date = db.Column(db.Date)
+    completed = db.Column(db.DateTime, nullable=False, index=True, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<ArchivedTask {self.body}>'
 
-''' This callback is used to reload the user object from the user ID stored in the session. It should take the unicode ID of a user, and return the corresponding user object. It should return None (not raise an exception) if the ID is not valid. (In that case, the ID will manually be removed from the session and processing will continue). '''
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'body': self.body,
+            'timestamp': self.timestamp.isoformat() + 'Z' if self.timestamp else None,
+            'due_date': self.due_date.isoformat() if self.due_date else None,
+            'completed': self.completed.isoformat() + 'Z',
+        }
+
+# Columns copied between the task and task_archive tables.
+_ARCHIVED_COLUMNS = ('body', 'timestamp', 'user_id', 'due_date')
+
+''' Move the tasks matching 'criterion' to the archive as completed, with one INSERT ... SELECT and one DELETE in the current transaction, so no task is loaded into Python. Returns the number of tasks moved. The caller calls User.touch_tasks() for the users whose tasks moved, and commits. '''
+def archive_tasks(criterion, completed=None):
+    columns = [getattr(Task, name) for name in _ARCHIVED_COLUMNS]
+    moved = select(columns + [literal(completed or datetime.utcnow(), type_=ArchivedTask.completed.type)]).where(criterion)
+    db.session.execute(ArchivedTask.__table__.insert().from_select(list(_ARCHIVED_COLUMNS) + ['completed'], moved))
+    return Task.query.filter(criterion).delete(synchronize_session=False)
+
+''' Move the archived tasks matching 'criterion' back to the task table as open tasks, with new ids. Returns the number of tasks moved. The caller touches the users' tasks and commits, as for archive_tasks(). '''
+def restore_tasks(criterion):
+    moved = select([getattr(ArchivedTask, name) for name in _ARCHIVED_COLUMNS]).where(criterion)
+    db.session.execute(Task.__table__.insert().from_select(list(_ARCHIVED_COLUMNS), moved))
+    return ArchivedTask.query.filter(criterion).delete(synchronize_session=False)
+
+''' Lease on the due date reminder scan (see app/reminders.py): the worker process running the scan and until when, so only one process scans at a time. '''
+class ReminderLease(db.Model):
+    name = db.Column(db.String(64), primary_key=True)
+    lease_owner = db.Column(db.String(128))
+    lease_expires = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<ReminderLease {self.name}>'
+
+''' Keyset (seek) pagination of tasks. A sort order is a list of segments which are read one after another. Each segment is a filter on the task table (or None) plus the columns that order it, ending with Task.id so the order is total, and whether it is read in descending order. Instead of an OFFSET, a page starts right after the sort key of the last row of the previous page, so reading page N costs the same as reading page 1.
+
+Ordering by due date uses two segments so tasks without a due date come last: first the tasks with a due date by (due_date, id), then the tasks without one by id. '''
+TASK_SORTS = {
+    'newest': [(None, (Task.timestamp, Task.id), True)],
+    'oldest': [(None, (Task.timestamp, Task.id), False)],
+    'due_date': [(Task.due_date.isnot(None), (Task.due_date, Task.id), False),
+                 (Task.due_date.is_(None), (Task.id,), False)],
+}
+
+# Named ranges of due dates, see due_date_range().
+DUE_RANGES = ('week', 'month', 'overdue')
+
+''' The first day and the day after the last of a named range of due dates around the day 'anchor': the week (Monday to Sunday) or the month it falls in, or 'overdue', every day before it, for which the first day is None. '''
+def due_date_range(name, anchor):
+    if name == 'week':
+        start = anchor - timedelta(days=anchor.weekday())
+        return start, start + timedelta(days=7)
+    if name == 'month':
+        start = anchor.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    if name == 'overdue':
+        return None, anchor
+    raise ValueError(f'unknown due date range {name!r}')
+
+''' Parse a day written as YYYY-MM-DD, for query parameters. Raises ValueError, so it can be passed as the 'type' of request.args.get(). '''
+def parse_day(text):
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+# Completed tasks, most recently completed first.
+ARCHIVE_SORT = [(None, (ArchivedTask.completed, ArchivedTask.id), True)]
+
+def _order_by(columns, descending):
+    return [column.desc() if descending else column for column in columns]
+
+''' Iterate over every task from 'query' in the order given by 'segments', one query per segment. '''
+def iter_sorted_tasks(query, segments):
+    for criterion, columns, descending in segments:
+        segment_query = query if criterion is None else query.filter(criterion)
+        for task in segment_query.order_by(*_order_by(columns, descending)):
+            yield task
+
+''' A page of tasks. 'next_cursor' and 'prev_cursor' are passed back as 'after' and 'before' to get the neighbouring pages, and are None when there is no page in that direction. '''
+TaskPage = namedtuple('TaskPage', ['tasks', 'next_cursor', 'prev_cursor'])
+
+# How each type of sort key column is written to and read from a cursor string.
+_CURSOR_TYPES = {
+    datetime: (lambda value: value.strftime('%Y-%m-%dT%H:%M:%S.%f'),
+               lambda text: datetime.strptime(text, '%Y-%m-%dT%H:%M:%S.%f')),
+    date: (lambda value: value.isoformat(),
+           lambda text: datetime.strptime(text, '%Y-%m-%d').date()),
+    int: (str, int),
+}
+
+''' A cursor is the segment number followed by the sort key of a task, separated by underscores, e.g. '0_2020-01-15_42'. '''
+def encode_cursor(segments, segment, task):
+    values = [str(segment)]
+    for column in segments[segment][1]:
+        dump = _CURSOR_TYPES[column.type.python_type][0]
+        values.append(dump(getattr(task, column.key)))
+    return '_'.join(values)
+
+''' Returns (segment, sort key values) for a cursor, or None if the cursor is malformed or belongs to a different sort order. '''
+def decode_cursor(segments, cursor):
+    try:
+        parts = cursor.split('_')
+        segment = int(parts[0])
+        if not 0 <= segment < len(segments):
+            return None
+        columns = segments[segment][1]
+        if len(parts) != len(columns) + 1:
+            return None
+        values = [_CURSOR_TYPES[column.type.python_type][1](part)
+                  for column, part in zip(columns, parts[1:])]
+    except (AttributeError, ValueError):
+        return None
+    return segment, values
+
+''' Filter on rows that sort strictly after the key 'values' in the given direction. The row value comparison (a, b) > (x, y) is served by a range scan on an index over (a, b). '''
+def _seek(columns, values, descending):
+    key = tuple_(*columns)
+    bound = tuple_(*[literal(value, type_=column.type) for column, value in zip(columns, values)])
+    return key < bound if descending else key > bound
+
+''' Get a page of tasks from 'query' in the order given by 'segments'. With 'after' the page starts after that cursor, with 'before' the page ends before it, and with neither the first page is returned. One extra row is read to know whether there is a further page. '''
+def paginate_tasks(query, segments, per_page, after=None, before=None):
+    cursor = decode_cursor(segments, after) if after else None
+    backwards = False
+    if cursor is None and before:
+        cursor = decode_cursor(segments, before)
+        backwards = cursor is not None
+
+    order = list(range(len(segments)))
+    if backwards:
+        order.reverse()
+    if cursor is not None:
+        order = order[order.index(cursor[0]):]
+
+    rows = []
+    for segment in order:
+        criterion, columns, descending = segments[segment]
+        descending = descending != backwards
+        segment_query = query if criterion is None else query.filter(criterion)
+        if cursor is not None and segment == cursor[0]:
+            segment_query = segment_query.filter(_seek(columns, cursor[1], descending))
+        segment_query = segment_query.order_by(*_order_by(columns, descending))
+        rows.extend((segment, task) for task in segment_query.limit(per_page + 1 - len(rows)))
+        if len(rows) > per_page:
+            break
+
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        # Stepped back past the first task, e.g. after deletions; show the first page instead.
+        if not rows:
+            return paginate_tasks(query, segments, per_page)
+        rows.reverse()
+        has_next, has_prev = True, more
+    else:
+        has_next, has_prev = more, cursor is not None
+
+    next_cursor = encode_cursor(segments, *rows[-1]) if rows and has_next else None
+    prev_cursor = encode_cursor(segments, *rows[0]) if rows and has_prev else None
+    return TaskPage([task for segment, task in rows], next_cursor, prev_cursor)
+
+''' Snapshot of the fields of a User that every request needs, kept by the user loader between requests. It is never attached to a database session, so it can be shared between threads; code that changes a user loads or updates the User itself. '''
+class CachedUser(UserMixin, TaskOwnerMixin):
+    FIELDS = ('id', 'username', 'task_sort', 'tasks_version', 'tasks_modified')
+
+    def __init__(self, user):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(user, field))
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+''' This callback is used to reload the user object from the user ID stored in the session. It should take the unicode ID of a user, and return the corresponding user object. It should return None (not raise an exception) if the ID is not valid. (In that case, the ID will manually be removed from the session and processing will continue).
+
+With USER_LOADER = 'cached' it returns a CachedUser. The cached one is checked against the user's tasks_version and task_sort, read by the only query of the request, which catches every change to their tasks or sort mode whichever process or session made it; the user is only loaded again when those differ, or when the cached one is missing, expired, or older than the session's 'user_stamp'. '''
 @login.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    if user_cache.backend is None:
+        return User.query.get(user_id)
+
+    def load():
+        user = User.query.get(user_id)
+        return CachedUser(user) if user is not None else None
+
+    # A deleted user has no row, so is never current.
+    def is_current(user):
+        row = db.session.query(User.tasks_version, User.task_sort).filter_by(id=user_id).first()
+        return row is not None and tuple(row) == (user.tasks_version, user.task_sort)
+
+    return user_cache.get_or_load(user_id, session.get('user_stamp'), load, is_current)
 
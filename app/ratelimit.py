@@ -0,0 +1,187 @@
+''' Rate limiting of sign-in attempts: logins, registrations, and API token requests. Every attempt costs a PBKDF2 hash and a few queries, so a burst of them, e.g. someone guessing passwords, could otherwise keep every worker busy. Two kinds of token bucket are kept. Every attempt takes a token from the bucket of the client's IP address, which caps how fast any one client can try. Each account named (the username or email address tried) has a bucket too, but an attempt only takes a token from it when its password turns out wrong (see failed()); before the password is checked the bucket is only looked at. So signing in successfully never counts against an account, and someone who knows a username cannot lock its owner out without guessing wrong over and over, which the IP buckets slow down. A bucket holds up to a set number of tokens and refills at that many per period, so short bursts pass while a steady stream is slowed to the refill rate. An attempt finding a bucket empty is rejected with RateLimited (429 Too Many Requests, with a Retry-After header) before any user is looked up or any password hashed.
+
+The buckets are kept by a backend: 'memory' in each worker process, or 'file' in an SQLite file that all the worker processes of a machine share, so the limits hold however requests are spread over workers. If the file cannot be used, attempts are let through rather than turning everyone away. '''
+
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import request
+from werkzeug.exceptions import TooManyRequests
+
+logger = logging.getLogger(__name__)
+
+# Longest account name kept as a bucket key; longer names share the bucket of their first characters.
+MAX_KEY_LENGTH = 128
+
+
+class RateLimited(TooManyRequests):
+    def __init__(self, retry_after):
+        super().__init__()
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+''' Take one token from a bucket of 'capacity' tokens refilled at 'capacity' per 'period' seconds. 'state' is the bucket's (tokens, updated) or None for a full one. Returns the new state and 0, or the unchanged state and the seconds until a token is available. '''
+def take_token(state, now, capacity, period):
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + max(0.0, now - updated) * capacity / period)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) * period / capacity
+
+
+''' The seconds until a bucket in 'state' has a token, 0 if it has one now, without taking it. '''
+def token_wait(state, now, capacity, period):
+    return take_token(state, now, capacity, period)[1]
+
+
+''' Buckets in this process, at most 'maxsize' of them. When full, the least recently used bucket is dropped, which is the same as it being full. '''
+class MemoryBackend:
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, now):
+        with self._lock:
+            state, retry_after = take_token(self._buckets.get(key), now, capacity, period)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+    def peek(self, key, capacity, period, now):
+        with self._lock:
+            return token_wait(self._buckets.get(key), now, capacity, period)
+
+
+''' Buckets in the SQLite file at 'path', shared by every process that opens it. Each take reads and writes its bucket in one IMMEDIATE transaction, so concurrent attempts from several processes are counted one after the other. Every 'prune_every' takes, buckets untouched for longer than any period, which are full again, are deleted. '''
+class FileBackend:
+    def __init__(self, path, prune_every=1000):
+        self.path = path
+        self.prune_every = prune_every
+        self.longest_period = 0
+        self.takes = 0
+        self._local = threading.local()
+
+    ''' One connection per thread, opened on first use, so none is carried over when gunicorn forks its workers. '''
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = wal')
+            # Losing the last few attempts in a crash only refills some buckets early.
+            connection.execute('PRAGMA synchronous = off')
+            connection.execute('CREATE TABLE IF NOT EXISTS bucket '
+                               '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, period, now):
+        connection = self._connection()
+        self.longest_period = max(self.longest_period, period)
+        self.takes += 1
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            state = connection.execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+            state, retry_after = take_token(state, now, capacity, period)
+            connection.execute('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)', (key, *state))
+            if self.takes % self.prune_every == 0:
+                connection.execute('DELETE FROM bucket WHERE updated < ?', (now - self.longest_period,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return retry_after
+
+    def peek(self, key, capacity, period, now):
+        state = self._connection().execute('SELECT tokens, updated FROM bucket WHERE key = ?', (key,)).fetchone()
+        return token_wait(state, now, capacity, period)
+
+
+''' Bucket keys of the account names tried, ignoring case and surrounding space. '''
+def account_keys(accounts):
+    names = {account.strip().lower()[:MAX_KEY_LENGTH] for account in accounts if account and account.strip()}
+    return [f'account:{name}' for name in sorted(names)]
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.backend = None
+        self.ip_limit = (10, 60)
+        self.account_limit = (5, 300)
+        self.proxy_count = 0
+        self.allowed = 0
+        self.rejected_ip = 0
+        self.rejected_account = 0
+        self.backend_errors = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    ''' Create the backend named by RATELIMIT_BACKEND: 'memory', 'file', or None to turn rate limiting off. '''
+    def init_app(self, app):
+        backend = app.config.get('RATELIMIT_BACKEND')
+        if backend == 'memory':
+            self.backend = MemoryBackend(app.config.get('RATELIMIT_MEMORY_SIZE', 10000))
+        elif backend == 'file':
+            self.backend = FileBackend(app.config['RATELIMIT_FILE'])
+        elif backend:
+            raise ValueError(f'Unknown RATELIMIT_BACKEND {backend!r}')
+        self.ip_limit = (app.config.get('RATELIMIT_IP_ATTEMPTS', 10), app.config.get('RATELIMIT_IP_PERIOD', 60))
+        self.account_limit = (app.config.get('RATELIMIT_ACCOUNT_ATTEMPTS', 5),
+                              app.config.get('RATELIMIT_ACCOUNT_PERIOD', 300))
+        self.proxy_count = app.config.get('RATELIMIT_PROXY_COUNT', 0)
+        app.extensions['rate_limiter'] = self
+
+    ''' The client's address. Behind 'proxy_count' proxies that each append the address they got the request from to X-Forwarded-For, it is the one the outermost proxy appended; earlier entries are whatever the client sent. '''
+    def client_ip(self):
+        route = request.access_route
+        if self.proxy_count and len(route) >= self.proxy_count:
+            return route[-self.proxy_count]
+        return request.remote_addr
+
+    ''' Call the backend's 'take' or 'peek' for one bucket. '''
+    def _call(self, method, key, limit, now):
+        try:
+            return getattr(self.backend, method)(key, *limit, now)
+        except sqlite3.Error:
+            logger.exception('Could not use the rate limit backend, letting the attempt through')
+            with self._lock:
+                self.backend_errors += 1
+            return 0
+
+    ''' Count one sign-in attempt of the current request against the client's address, and check the given account names without counting against them. Raises RateLimited if the address or any of the accounts is out of attempts. '''
+    def hit(self, *accounts):
+        if self.backend is None:
+            return
+        now = time.time()
+        retry_after = self._call('take', f'ip:{self.client_ip()}', self.ip_limit, now)
+        if retry_after:
+            with self._lock:
+                self.rejected_ip += 1
+            raise RateLimited(retry_after)
+        retry_after = max([self._call('peek', key, self.account_limit, now) for key in account_keys(accounts)],
+                          default=0)
+        with self._lock:
+            if retry_after:
+                self.rejected_account += 1
+            else:
+                self.allowed += 1
+        if retry_after:
+            raise RateLimited(retry_after)
+
+    ''' Count a wrong password against the given account names. Called after the password check fails, so only failed attempts use up an account's attempts. '''
+    def failed(self, *accounts):
+        if self.backend is None:
+            return
+        now = time.time()
+        for key in account_keys(accounts):
+            self._call('take', key, self.account_limit, now)
+
+    def stats(self):
+        with self._lock:
+            return {'allowed': self.allowed, 'rejected_ip': self.rejected_ip, 'rejected_account': self.rejected_account,
+                    'backend_errors': self.backend_errors}
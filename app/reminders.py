@@ -0,0 +1,233 @@
+''' Due date reminders, sent by the 'flask send-reminders' worker. Each task records when its reminder was sent in Task.reminded_at, which Task.set_due_date() and the API's batch update clear again. Each run reads the tasks not reminded yet that are due between REMINDER_LOOKBACK_DAYS days ago and REMINDER_LEAD_DAYS days from now, in (due_date, id) order off the ix_task_unreminded_due_date_id index, which only holds tasks not reminded yet. Every batch is marked reminded as it is delivered, so the next run never sees those tasks again. A run therefore only reads the tasks that came into range since the last run, and never scans the whole task table, while a task given a short-notice due date is reminded by the next run, however its id or due date compare with the tasks reminded before.
+
+The reminders of a batch are handed to a sink (log, file, or SMTP) by a small thread pool. A task is only marked reminded once its reminder has been delivered, so delivery is at least once: a failed reminder is tried again by the next runs, up to REMINDER_MAX_ATTEMPTS times in all (counted in Task.reminder_attempts), after which it is given up, so reminders that can never be delivered do not pile up at the front of the scan. Within a run the scan carries on after the last task of each batch, so one failed reminder does not hold up the others; only when every reminder of a batch fails is the sink taken to be down and the run ended. Several worker processes can run at once. The scan is leased to one of them at a time through a conditional UPDATE of the reminder_lease row, and the others skip their run. '''
+
+import datetime
+import json
+import logging
+import os
+import smtplib
+import socket
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import User, Task, ReminderLease, _seek
+
+logger = logging.getLogger(__name__)
+
+Reminder = namedtuple('Reminder', ['task_id', 'body', 'due_date', 'user_id', 'username', 'email'])
+
+
+class LogSink:
+    def __init__(self, target, config):
+        pass
+
+    def send(self, reminder):
+        logger.info('Reminder for %s: task %d "%s" is due %s', reminder.username, reminder.task_id, reminder.body,
+                    reminder.due_date.isoformat())
+
+    def close(self):
+        pass
+
+
+''' Appends each reminder to the file 'target' as a line of JSON. '''
+class FileSink:
+    def __init__(self, target, config):
+        if not target:
+            raise ValueError("the file sink needs a path, e.g. 'file:reminders.ndjson'")
+        self.file = open(target, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def send(self, reminder):
+        line = json.dumps(dict(reminder._asdict(), due_date=reminder.due_date.isoformat())) + '\n'
+        with self._lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+''' E-mails each reminder through the SMTP server at 'target' (host:port, localhost:25 by default), e.g. a local relay or a stand-in like 'python -m smtpd -n -c DebuggingServer localhost:1025'. '''
+class SMTPSink:
+    def __init__(self, target, config):
+        host, _, port = (target or 'localhost').partition(':')
+        self.host = host
+        self.port = int(port or 25)
+        self.sender = config['REMINDER_MAIL_FROM']
+
+    def send(self, reminder):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = reminder.email
+        message['Subject'] = f'Due {reminder.due_date.strftime("%m/%d/%Y")}: {reminder.body[:60]}'
+        message.set_content(f'Hi {reminder.username},\n\nYour task "{reminder.body}" is due on '
+                            f'{reminder.due_date.strftime("%m/%d/%Y")}.\n')
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(message)
+
+    def close(self):
+        pass
+
+
+SINKS = {'log': LogSink, 'file': FileSink, 'smtp': SMTPSink}
+
+
+''' Make a sink from a REMINDER_SINK value: a sink name, optionally followed by a colon and its target. '''
+def make_sink(spec, config):
+    name, _, target = spec.partition(':')
+    if name not in SINKS:
+        raise ValueError(f"unknown reminder sink {name!r}, expected one of {', '.join(SINKS)}")
+    return SINKS[name](target or None, config)
+
+
+''' Totals over the runs of a scheduler. '''
+class ReminderStats:
+    def __init__(self):
+        self.runs = 0
+        self.batches = 0
+        self.sent = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+    @property
+    def reminders_per_second(self):
+        return self.sent / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {'runs': self.runs, 'batches': self.batches, 'sent': self.sent, 'failed': self.failed}
+
+    ''' Write the totals to 'path' in Prometheus text format, for the node exporter's textfile collector. The file is replaced in one step so it is never read half written. '''
+    def write_metrics(self, path):
+        lines = []
+        for key, value in sorted(self.as_dict().items()):
+            lines.append(f'# TYPE todo_reminders_{key}_total counter')
+            lines.append(f'todo_reminders_{key}_total {value}')
+        lines.append('# TYPE todo_reminders_seconds_total counter')
+        lines.append(f'todo_reminders_seconds_total {self.seconds}')
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temporary, path)
+
+
+class ReminderScheduler:
+    def __init__(self, sink, name='default', batch_size=500, workers=4, lead_days=1, lookback_days=7,
+                 lease_seconds=60, max_attempts=5):
+        self.sink = sink
+        self.name = name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.lead_days = lead_days
+        self.lookback_days = lookback_days
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self.stats = ReminderStats()
+
+    ''' Take the lease on the scan, creating its row on first use. Returns False if another process holds an unexpired lease. '''
+    def acquire_lease(self):
+        if ReminderLease.query.get(self.name) is None:
+            try:
+                db.session.add(ReminderLease(name=self.name))
+                db.session.commit()
+            except IntegrityError:
+                # Another process created it first.
+                db.session.rollback()
+        now = datetime.datetime.utcnow()
+        taken = ReminderLease.query.filter(
+            ReminderLease.name == self.name,
+            ReminderLease.lease_owner.is_(None) | (ReminderLease.lease_owner == self.owner) |
+            (ReminderLease.lease_expires < now)).update(
+            {ReminderLease.lease_owner: self.owner,
+             ReminderLease.lease_expires: now + datetime.timedelta(seconds=self.lease_seconds)},
+            synchronize_session=False)
+        db.session.commit()
+        return taken == 1
+
+    def release_lease(self):
+        ReminderLease.query.filter_by(name=self.name, lease_owner=self.owner).update(
+            {ReminderLease.lease_owner: None, ReminderLease.lease_expires: None},
+            synchronize_session=False)
+        db.session.commit()
+
+    ''' Record the outcome of a batch: mark the tasks whose reminders were delivered reminded, count one more attempt for the others, and extend the lease. A task whose due date was changed since it was read is left alone, so its new due date is reminded afresh. Returns False if the lease was lost, e.g. because a batch took longer than the lease to deliver. '''
+    def record(self, batch, delivered):
+        now = datetime.datetime.utcnow()
+        task_ids = defaultdict(list)
+        for reminder, ok in zip(batch, delivered):
+            task_ids[reminder.due_date, ok].append(reminder.task_id)
+        for (due_date, ok), ids in task_ids.items():
+            changes = {Task.reminded_at: now} if ok else {Task.reminder_attempts: Task.reminder_attempts + 1}
+            Task.query.filter(Task.id.in_(ids), Task.due_date == due_date).update(
+                changes, synchronize_session=False)
+        extended = ReminderLease.query.filter_by(name=self.name, lease_owner=self.owner).update(
+            {ReminderLease.lease_expires: now + datetime.timedelta(seconds=self.lease_seconds)},
+            synchronize_session=False)
+        db.session.commit()
+        return extended == 1
+
+    ''' The first 'batch_size' tasks not reminded yet, nor given up on, that are due from 'earliest' to 'horizon' and come after 'position' (a (due_date, id), or None to start at the beginning), in (due_date, id) order, with their owner's name and e-mail address. '''
+    def next_batch(self, earliest, horizon, position=None):
+        query = db.session.query(Task.id, Task.body, Task.due_date, User.id, User.username, User.email).join(
+            User, User.id == Task.user_id).filter(
+            Task.reminded_at.is_(None), Task.reminder_attempts < self.max_attempts,
+            Task.due_date >= earliest, Task.due_date <= horizon)
+        if position is not None:
+            query = query.filter(_seek((Task.due_date, Task.id), position, False))
+        rows = query.order_by(Task.due_date, Task.id).limit(self.batch_size).all()
+        # End the read transaction, so it is not held open while the batch is delivered.
+        db.session.commit()
+        return [Reminder(*row) for row in rows]
+
+    def deliver(self, reminder):
+        try:
+            self.sink.send(reminder)
+            return True
+        except Exception:
+            logger.exception('Could not deliver the reminder for task %d', reminder.task_id)
+            return False
+
+    ''' Send the reminders that came due since the last run. Returns the number sent, or None if another process holds the lease. '''
+    def run_once(self, today=None):
+        today = today or datetime.datetime.utcnow().date()
+        earliest = today - datetime.timedelta(days=self.lookback_days)
+        horizon = today + datetime.timedelta(days=self.lead_days)
+        if not self.acquire_lease():
+            return None
+        started = time.perf_counter()
+        sent = 0
+        position = None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                while True:
+                    batch = self.next_batch(earliest, horizon, position)
+                    if not batch:
+                        break
+                    delivered = list(executor.map(self.deliver, batch))
+                    self.stats.batches += 1
+                    self.stats.sent += delivered.count(True)
+                    self.stats.failed += delivered.count(False)
+                    sent += delivered.count(True)
+                    held = self.record(batch, delivered)
+                    position = (batch[-1].due_date, batch[-1].task_id)
+                    if not any(delivered):
+                        logger.warning('Every reminder of a batch failed; ending the run until the sink recovers')
+                        break
+                    if not all(delivered):
+                        logger.warning('%d reminders failed; they will be tried again next run, up to %d attempts',
+                                       delivered.count(False), self.max_attempts)
+                    if not held:
+                        logger.warning('Lost the lease on the reminder scan %r', self.name)
+                        break
+                    if len(batch) < self.batch_size:
+                        break
+        finally:
+            self.release_lease()
+            self.stats.runs += 1
+            self.stats.seconds += time.perf_counter() - started
+        return sent
@@ -1,164 +1,279 @@
+import calendar
 import datetime
-from flask import render_template, flash, redirect, url_for, request
-from app import app, db
-from app.forms import LoginForm, RegistrationForm, TaskForm, DueDateForm
-from flask_login import current_user, login_user, logout_user
-from app.models import User, Task
-''' Flask-Login contains the 'current_user' proxy, which interfaces with the database, so when 'current_user' is called the return is the current User class user object that is logged in. '''
+import hashlib
+import time
+from flask import Blueprint, current_app, render_template, flash, redirect, url_for, request, session, abort, stream_with_context, get_template_attribute
+from app import db, task_cache, rate_limiter
+from app.database import reads_from_replica
+from sqlalchemy.exc import IntegrityError
+from app.forms import LoginForm, RegistrationForm, TaskForm, DueDateForm, ImportForm, SearchForm
+from flask_login import current_user, login_user, logout_user, login_required
+from app.models import User, Task, ArchivedTask, TASK_SORTS, DUE_RANGES, due_date_range, parse_day, archive_tasks, restore_tasks
+from app.export import EXPORT_FORMATS, MIMETYPES, export_tasks, export_filename
+from app.importer import import_tasks
+from app.search import search_tasks
+from app.hashing import HashingBusy
+
+bp = Blueprint('main', __name__)
+
+''' Views marked with @reads_from_replica only read, and their GET requests read from the replica when one is configured (see app/database.py). A GET that does write, like the index page's 'sort' parameter, reads from the primary once it has written. '''
+
+''' Flask-Login contains the 'current_user' proxy, so when 'current_user' is called the return is the user object that is logged in: a User loaded from the database, or a CachedUser snapshot of it when USER_LOADER is 'cached' (see load_user). '''
 
 # Index (Home Page) Route Function
-@app.route('/', methods=['GET', 'POST'])
-@app.route('/index', methods=['GET', 'POST'])
+@bp.route('/', methods=['GET', 'POST'])
+@bp.route('/index', methods=['GET', 'POST'])
+@reads_from_replica
 def index():
     # If viewing app as an anonymous user the user is shown default welcome page.
     if current_user.is_anonymous:
         return render_template('index.html', title='Home')
 
+    after = request.args.get('after')
+    before = request.args.get('before')
+
+    ''' The 'sort' query parameter switches the user's sort preference and shows the list in one request, instead of a sort route redirecting to this one. The preference is only written when it changes. '''
+    sort_mode = request.args.get('sort')
+    if sort_mode in TASK_SORTS and current_user.set_sort_mode(sort_mode):
+        db.session.commit()
+
+    ''' A GET for a task list the browser already has is answered with 304 Not Modified before any task is queried or rendered. Pending flash messages are only shown in a full page, so they always get one. '''
+    if request.method == 'GET' and '_flashes' not in session:
+        etag = task_list_etag(after, before)
+        if request.if_none_match.contains(etag):
+            return set_task_list_validators(current_app.response_class(status=304), etag)
+
     form = TaskForm()
     # If TaskForm is submitted and validated a new task is added to user's to-do list.
     if form.validate_on_submit():
-        task = Task(body=form.task.data, author=current_user)
+        task = Task(body=form.task.data, user_id=current_user.id)
         db.session.add(task)
+        User.touch_tasks(current_user.id)
         db.session.commit()
-        flash(f'You added a to-do task, {current_user.username} ')
-        ''' Redirect to index after POST request generated by a web form submission to avoid sumbitting duplicate posts. '''
-        return redirect(url_for('index'))
-
-    # Get user's sorting preference for their tasks to display in HTML template.
-    user = User.query.filter_by(id=current_user.id).first()
-    tasks = user.get_sorted_view_of_tasks()
-
-    # Render personal index page.
-    return render_template('index.html', title='Home', form=form, tasks=tasks)
+        # In fragment mode the first page of the list, which now holds the new task, is sent back below instead.
+        if wants_fragment():
+            after = before = None
+        else:
+            flash(f'You added a to-do task, {current_user.username} ')
+            ''' Redirect to index after POST request generated by a web form submission to avoid sumbitting duplicate posts. '''
+            return redirect(url_for('.index'))
+    elif form.is_submitted() and wants_fragment():
+        # tasks.js then submits the form normally, and the page shows the errors.
+        return '', 400
+
+    ''' Get one page of the user's tasks in their sorting preference to display in HTML template. The 'after' and 'before' query parameters are the cursors of the next and previous page links. The rendered list is cached until the user's tasks change, so a repeated view does not query the tasks at all. '''
+    def render_task_list():
+        page = current_user.get_page_of_tasks(after=after, before=before)
+        return render_template('_task_list.html', tasks=page.tasks, page=page)
+
+    # After a task is added in fragment mode, current_user may still hold the task list version from before it.
+    if request.method == 'POST':
+        task_list = render_task_list()
+    else:
+        task_list = task_cache.get_or_render(current_user.id, current_user.tasks_version, current_user.sort_mode,
+                                             f'{after}:{before}', render_task_list)
+
+    # Render personal index page, or only the task list in fragment mode. The ETag is taken after rendering, which creates the session's CSRF token on a first visit.
+    if wants_fragment():
+        response = current_app.make_response(task_list)
+    else:
+        response = current_app.make_response(render_template('index.html', title='Home', form=form, task_list=task_list,
+                                                          search_form=SearchForm(formdata=None)))
+    response.vary.add('X-Fragment')
+    if request.method == 'GET':
+        set_task_list_validators(response, task_list_etag(after, before))
+    return response
+
+''' Strong ETag of the current user's index page. Besides the version of their task list, sort mode, and page, it covers the session's CSRF token and a time window of half the token lifetime, so a page kept by the browser never holds an expired token for the task form. The task list sent alone in fragment mode has an ETag of its own. '''
+def task_list_etag(after, before):
+    window = int(time.time() // ((current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600) / 2))
+    key = (f'{current_user.id}:{current_user.tasks_version}:{current_user.sort_mode}:{after}:{before}:'
+           f'{session.get("csrf_token")}:{window}:{wants_fragment()}')
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+''' Add the ETag and Last-Modified headers to an index page response. 'no-cache' makes the browser revalidate on every view, and 'private' keeps shared caches from storing it. '''
+def set_task_list_validators(response, etag):
+    response.set_etag(etag)
+    response.last_modified = current_user.tasks_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+''' Fragment mode. app/static/tasks.js sends its requests with an 'X-Fragment: 1' header, and the routes that change tasks then answer with only the part of the page that changed, instead of a redirect to the whole index page: the row of the changed task (rendered by the macro in _task_row.html), the task list, or nothing for a task that left the page. That is one request per action instead of two, and the response does not grow with the user's list. Requests without the header are answered as before, so the pages work without JavaScript. '''
+def wants_fragment():
+    return request.headers.get('X-Fragment') == '1'
+
+def task_row(task):
+    return get_template_attribute('_task_row.html', 'task_row')(task)
+
+''' Answer to an action on a task that is not the user's, or is gone: a redirect to the page the action came from, or 404 in fragment mode, upon which tasks.js loads that page. '''
+def task_not_found(endpoint='.index'):
+    if wants_fragment():
+        abort(404)
+    return redirect(url_for(endpoint))
 
 # Login Route Function
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
+    ''' Count the attempt against the client's address and the account tried, and turn it away with 429 if either is out of attempts (see app/ratelimit.py). This comes first, before the user is looked up or the password hashed. '''
+    if request.method == 'POST':
+        rate_limiter.hit(request.form.get('username'))
+
     # If user is already logged in but navigates to /login URL redirect to index page.
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
     form = LoginForm()
     # If LoginForm is submitted and validated, check username and password and login user if authenticated.
     if form.validate_on_submit():
-        ''' The user can log in with their username or email address. The 'username' and 'email' variables are database User model objects which are set by a database search of a user's username or email, whichever the user inputs to log in. '''
-        username = User.query.filter_by(username=form.username.data).first()
-        email = User.query.filter_by(email=form.username.data).first()
+        ''' The user can log in with their username or email address. The 'user' variable is the database User model object found by a single search of both the username and email columns, whichever the user inputs to log in. '''
+        user = User.find_by_login(form.username.data)
 
         # Check username (or email) and password, if one or both are invalid flash error message and redirect to /login.
-        if username:
-            if not username.check_password(form.password.data):
+        try:
+            if user is None or not user.check_and_upgrade_password(form.password.data):
+                # Only wrong passwords count against the account's attempts.
+                rate_limiter.failed(form.username.data)
                 flash('Invalid username or password')
-                return redirect(url_for('login'))
-        elif email:
-            if not email.check_password(form.password.data):
-                flash('Invalid username or password')
-                return redirect(url_for('login'))
-        else:
-            flash('Invalid username or password')
-            return redirect(url_for('login'))
+                return redirect(url_for('.login'))
+        except HashingBusy:
+            # Every password hashing slot is taken by other logins, so turn this one away rather than queue it.
+            flash('Too many people are signing in right now, please try again in a moment')
+            return render_template('login.html', title='Sign In', form=form), 503
+        # Store a password hash that was upgraded to the current hashing settings.
+        if db.session.is_modified(user):
+            db.session.commit()
 
         ''' By default, when the user closes their browser the Flask Session is deleted and the user is logged out. “Remember Me” prevents the user from accidentally being logged out when they close their browser. '''
-        if username:
-            login_user(username, remember=form.remember_me.data)
-        elif email:
-            login_user(email, remember=form.remember_me.data)
+        login_user(user, remember=form.remember_me.data)
 
         # if user is authenticated and logged in, redirect to /index.
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
     # If there is an error with form submission render default login page.
     return render_template('login.html', title='Sign In', form=form)
 
 # Logout Route Function
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     # Call Flask-Login's logout_user function.
     logout_user()
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
 
 # Register Account Route Function
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
+    # Rate limited like login, before the username and email are checked or the password hashed. No password is checked, so only the client's address is charged.
+    if request.method == 'POST':
+        rate_limiter.hit(request.form.get('username'), request.form.get('email'))
+
     # If user is already registered but navigates to /register URL redirect to index page.
     if current_user.is_authenticated:
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
 
     form = RegistrationForm()
+    ''' The validators that check the username and email are free may read from the replica. A name taken since, or not yet copied to the replica, is caught by the unique constraints when the user is added. '''
+    with db.replica_reads():
+        submitted = form.validate_on_submit()
     # If RegistrationForm is submitted and validated created new user model in database.
-    if form.validate_on_submit():
+    if submitted:
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HashingBusy:
+            flash('Too many people are signing in right now, please try again in a moment')
+            return render_template('register.html', title='Register', form=form), 503
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('Please use a different username or email address.')
+            return render_template('register.html', title='Register', form=form)
         flash('Congratulations, you are now a registered user!')
         # Redirect newly registered user to login page.
-        return redirect(url_for('login'))
+        return redirect(url_for('.login'))
 
     # If form not validated, render again registration page.
     return render_template('register.html', title='Register', form=form)
 
-# Delete Task Route Function. Dynamic 'task_id' is passed via GET request.
-@app.route('/delete_task/<task_id>')
+# Complete Task Route Function. Dynamic 'task_id' is passed via GET request.
+@bp.route('/delete_task/<int:task_id>')
+@login_required
 def delete_task(task_id):
-    # The unique task the user chose to delete, based on dynamic 'task_id'.
-    task = Task.query.filter_by(id=int(task_id)).first()
-    # If error occurs while searching database for task, redirect to index.
-    if task is None:
-        return redirect(url_for('index'))
-    db.session.delete(task)
+    ''' Move the task the user completed to their archive, based on dynamic 'task_id'. Only the user's own tasks are moved, and the task is moved by the database without loading it. '''
+    completed = archive_tasks((Task.id == task_id) & (Task.user_id == current_user.id))
+    # If there is no such task, redirect to index.
+    if not completed:
+        return task_not_found()
+    User.touch_tasks(current_user.id)
     db.session.commit()
-    flash(f'Task Deleted')
-    return redirect(url_for('index'))
+    # In fragment mode the script removes the task's row.
+    if wants_fragment():
+        return '', 204
+    flash('Task Completed')
+    return redirect(url_for('.index'))
+
+# Archived Tasks Route Function. Lists the user's completed tasks, most recently completed first, one page at a time.
+@bp.route('/archive')
+@reads_from_replica
+@login_required
+def archive():
+    page = current_user.get_page_of_archived_tasks(after=request.args.get('after'), before=request.args.get('before'))
+    return render_template('archive.html', title='Completed Tasks', tasks=page.tasks, page=page)
+
+# Restore Task Route Function. Moves a completed task back to the to-do list. Dynamic 'task_id' is the id of the archived task.
+@bp.route('/restore_task/<int:task_id>')
+@login_required
+def restore_task(task_id):
+    restored = restore_tasks((ArchivedTask.id == task_id) & (ArchivedTask.user_id == current_user.id))
+    if not restored:
+        return task_not_found('.archive')
+    User.touch_tasks(current_user.id)
+    db.session.commit()
+    # In fragment mode the script removes the task's row from the archive page.
+    if wants_fragment():
+        return '', 204
+    flash('Task Restored')
+    return redirect(url_for('.index'))
 
+''' Sort Route Functions. They set the user's preference to view their tasks by newest, oldest, or due date (earliest first) and go back to the index page, which can also be asked for directly with its 'sort' query parameter. '''
 # Sort User Tasks By Newest Route Function
-@app.route('/newest')
+@bp.route('/newest')
+@login_required
 def newest():
-    ''' Set user model boolean variables to sort tasks by user's selected preference. Here user chose to view by newest tasks first. '''
-    user = User.query.filter_by(id=current_user.id).first()
-    user.set_sorted_view_of_tasks(view_by_newest=True, view_by_oldest=False, view_by_due_date=False)
-
-    db.session.commit()
-
-    return redirect(url_for('index'))
+    return set_sort_mode_and_redirect('newest')
 
 # Sort User Tasks By Oldest Route Function
-@app.route('/oldest')
+@bp.route('/oldest')
+@login_required
 def oldest():
-    ''' Set user model boolean variables to sort tasks by user's selected preference. Here user chose to view by oldest tasks first. '''
-    user = User.query.filter_by(id=current_user.id).first()
-    user.set_sorted_view_of_tasks(view_by_newest=False, view_by_oldest=True, view_by_due_date=False)
-
-    db.session.commit()
-
-    return redirect(url_for('index'))
+    return set_sort_mode_and_redirect('oldest')
 
 # Sort User Tasks By Due Date Route Function
-@app.route('/view_by_due_date')
+@bp.route('/view_by_due_date')
+@login_required
 def view_by_due_date():
-    ''' Set user model boolean variables to sort tasks by user's selected preference. Here user chose to view by due date (earliest first). '''
-    user = User.query.filter_by(id=current_user.id).first()
-    user.set_sorted_view_of_tasks(view_by_newest=False, view_by_oldest=False, view_by_due_date=True)
+    return set_sort_mode_and_redirect('due_date')
 
-    db.session.commit()
-
-    return redirect(url_for('index'))
+def set_sort_mode_and_redirect(sort_mode):
+    # Nothing is written when the preference has not changed.
+    if current_user.set_sort_mode(sort_mode):
+        db.session.commit()
+    return redirect(url_for('.index'))
 
 # Set Due Date Route Function. Dynamic 'task_id' is passed via GET request.
-@app.route('/set_due_date/<task_id>', methods=['GET', 'POST'])
+@bp.route('/set_due_date/<int:task_id>', methods=['GET', 'POST'])
+@login_required
 def set_due_date(task_id):
-    # If viewing app as an anonymous user the user is shown default welcome page.
-    if current_user.is_anonymous:
-        return render_template('index.html', title='Home')
-
     form = DueDateForm()
     ''' If DueDateForm is submitted and validated create a due date for the unique task the user chose, based on dynamic 'task_id'. '''
     if form.validate_on_submit():
-        # The unique task the user chose to add a due date, based on dynamic 'task_id'.
-        task = Task.query.filter_by(id=int(task_id)).first()
+        # The unique task the user chose to add a due date, based on dynamic 'task_id'. Only the user's own tasks are found.
+        task = current_user.get_task(task_id)
         # If error occurs while searching database for task, redirect to index.
         if task is None:
-            return redirect(url_for('index'))
+            return task_not_found()
 
         ''' Flask request.form is a dictionary lookup, it returns a value that corresponds to the lookup key. Here the key is the HTML 'name' attribute, and the value it returns is the HTML 'value' attribute. For example, a user will input a due date of 12/01/2020 and the element will show:
 
@@ -173,28 +288,117 @@ def set_due_date(task_id):
 
         task.set_due_date(due_date)
         db.session.add(task)
+        User.touch_tasks(task.user_id)
         db.session.commit()
+        # In fragment mode send back the task's row, now showing the due date.
+        if wants_fragment():
+            return task_row(task)
         flash(f'Due Date Set For {month}/{day}/{year}')
         # Redirect to users personal to-do list.
-        return redirect(url_for('index'))
+        return redirect(url_for('.index'))
+    elif form.is_submitted() and wants_fragment():
+        # tasks.js then opens the due date page, where the date can be entered again.
+        return '', 400
 
     # If form is not vaidated, render again due date page.
     return render_template('due_date.html', title='Set Due Date', form=form)
 
 # Remove Due Date Route Function. Dynamic 'task_id' is passed via GET request.
-@app.route('/remove_due_date/<task_id>')
+@bp.route('/remove_due_date/<int:task_id>')
+@login_required
 def remove_due_date(task_id):
-    # The unique task the user chose to remove a due date, based on dynamic 'task_id'.
-    task = Task.query.filter_by(id=int(task_id)).first()
+    # The unique task the user chose to remove a due date, based on dynamic 'task_id'. Only the user's own tasks are found.
+    task = current_user.get_task(task_id)
     # If error occurs while searching database for task, redirect to index.
     if task is None:
-        return redirect(url_for('index'))
+        return task_not_found()
 
     # Set Task model due_date variable to None, i.e. remove current due date.
     due_date = None
     task.set_due_date(due_date)
     db.session.add(task)
+    User.touch_tasks(task.user_id)
     db.session.commit()
+    # In fragment mode send back the task's row, now without a due date.
+    if wants_fragment():
+        return task_row(task)
     flash(f'Due Date Removed')
     # Redirect to users personal to-do list.
-    return redirect(url_for('index'))
+    return redirect(url_for('.index'))
+
+''' Export Tasks Route Function. Streams all of the user's tasks as a file download. Query parameters: 'format' is 'ndjson' (default) or 'csv', 'sort' is 'newest', 'oldest', or 'due_date' (default is the user's preference), and 'gzip=1' compresses the file. '''
+@bp.route('/export')
+@reads_from_replica
+@login_required
+def export():
+    fmt = request.args.get('format', 'ndjson')
+    sort_mode = request.args.get('sort', current_user.sort_mode)
+    if fmt not in EXPORT_FORMATS or sort_mode not in TASK_SORTS:
+        abort(404)
+    compress = request.args.get('gzip') == '1'
+
+    # The response body is generated while it is sent, inside the request context so it can keep using the database session.
+    body = stream_with_context(export_tasks(current_user.id, sort_mode, fmt, compress))
+    response = current_app.response_class(body, mimetype='application/gzip' if compress else MIMETYPES[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={export_filename(fmt, compress)}'
+    return response
+
+''' Import Tasks Route Function. Adds every task of an uploaded NDJSON or CSV file (gzip compressed if its name ends in .gz) to the user's to-do list, IMPORT_CHUNK_SIZE tasks per transaction. '''
+@bp.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_file():
+    form = ImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        report = import_tasks(current_user.id, upload.stream, form.format.data,
+                              chunk_size=current_app.config['IMPORT_CHUNK_SIZE'],
+                              compressed=(upload.filename or '').endswith('.gz'))
+        flash(report.summary())
+        # Show the first few problems, with the line of the file they were found on.
+        for line, error in report.errors[:5]:
+            flash(f'Line {line}: {error}' if line else error)
+        return redirect(url_for('.index'))
+
+    # If form is not validated, render again import page.
+    return render_template('import.html', title='Import Tasks', form=form)
+
+''' Search Tasks Route Function. Shows the user's tasks matching the words of the 'q' query parameter, best match first, one page at a time ('page' query parameter). The search uses the full-text index, see app/search.py. '''
+@bp.route('/search')
+@reads_from_replica
+@login_required
+def search():
+    form = SearchForm(request.args)
+    results = None
+    if form.validate():
+        results = search_tasks(current_user.id, form.q.data, page=request.args.get('page', 1, type=int),
+                               per_page=current_app.config['TASKS_PER_PAGE'])
+    return render_template('search.html', title='Search Tasks', form=form, results=results)
+
+''' Calendar Route Function. Shows the user's tasks due in a range of days, a page at a time, and a calendar grid with the number of tasks due on each day. Query parameters: 'range' is 'week' (default), 'month', or 'overdue', and 'start' (YYYY-MM-DD, default today) is a day in the week or month to show. Only the tasks of the range are read, see get_page_of_tasks_due() and count_tasks_due_by_day(). '''
+@bp.route('/calendar')
+@reads_from_replica
+@login_required
+def due_calendar():
+    range_name = request.args.get('range', 'week')
+    if range_name not in DUE_RANGES:
+        abort(404)
+    today = datetime.datetime.utcnow().date()
+    anchor = request.args.get('start', today, type=parse_day)
+    start, end = due_date_range(range_name, today if range_name == 'overdue' else anchor)
+
+    counts = current_user.count_tasks_due_by_day(start, end)
+    page = current_user.get_page_of_tasks_due(start, end, after=request.args.get('after'),
+                                              before=request.args.get('before'))
+
+    # Weeks of days to draw the grid with. Overdue tasks have no grid, only their list.
+    if range_name == 'week':
+        weeks = [[start + datetime.timedelta(days=day) for day in range(7)]]
+    elif range_name == 'month':
+        weeks = calendar.Calendar().monthdatescalendar(start.year, start.month)
+    else:
+        weeks = []
+    # The day to show for the 'previous' and 'next' links, in the week or month before and after this one.
+    neighbours = (start - datetime.timedelta(days=1), end) if weeks else None
+
+    return render_template('calendar.html', title='Calendar', range_name=range_name, start=start, end=end,
+                           today=today, counts=counts, weeks=weeks, neighbours=neighbours, page=page)
@@ -0,0 +1,85 @@
+''' Full-text search of a user's task bodies, backed by the database's own text index rather than a LIKE '%term%' scan of every task. On SQLite the index is an FTS5 table, task_fts, holding the body of each task under the task's id; triggers on the task table keep it in sync on every insert, update, and delete, however the rows are written. On PostgreSQL it is a GIN index over to_tsvector() of the body, which the database maintains itself. Both are created by migration e6a1c4d93f27, and by db.create_all() through the DDL events below.
+
+Results are ranked by relevance (bm25 on SQLite, ts_rank on PostgreSQL) and paginated by page number. A relevance ranking has no stable sort key to seek from, so unlike the task list this uses LIMIT/OFFSET, over the user's matches only. '''
+
+import re
+from collections import namedtuple
+from sqlalchemy import DDL, event, func, literal_column, table, column
+from app import db
+from app.models import Task
+
+# Search terms beyond this many are ignored.
+MAX_TERMS = 8
+
+# PostgreSQL text search configuration. It is part of the index expression, so changing it needs a migration.
+TEXT_SEARCH_CONFIG = 'english'
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE task_fts USING fts5(body, content='task', content_rowid='id')",
+    "CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN "
+    "INSERT INTO task_fts (rowid, body) VALUES (new.id, new.body); END",
+    "CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN "
+    "INSERT INTO task_fts (task_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER task_fts_update AFTER UPDATE OF body ON task BEGIN "
+    "INSERT INTO task_fts (task_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+    "INSERT INTO task_fts (rowid, body) VALUES (new.id, new.body); END",
+]
+
+POSTGRESQL_DDL = [
+    f"CREATE INDEX ix_task_body_fts ON task USING gin (to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(body, '')))",
+]
+
+for statement in SQLITE_DDL:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in POSTGRESQL_DDL:
+    event.listen(Task.__table__, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+task_fts = table('task_fts', column('rowid'), column('rank'))
+
+''' A page of search results. 'page' counts from 1, and 'has_next' tells whether there is a further page. '''
+SearchPage = namedtuple('SearchPage', ['tasks', 'page', 'has_next'])
+
+
+''' The words of a search, without any query syntax, so user input can never make an invalid query. '''
+def search_terms(text):
+    return re.findall(r'\w+', text or '')[:MAX_TERMS]
+
+
+''' Tasks matching every term by prefix, best match first. bm25 ranks are negative, lower is better. '''
+def _sqlite_query(user_id, terms):
+    match = ' '.join(f'"{term}"*' for term in terms)
+    return Task.query.join(task_fts, task_fts.c.rowid == Task.id).filter(
+        Task.user_id == user_id, literal_column('task_fts').op('MATCH')(match)).order_by(
+        task_fts.c.rank, Task.id.desc())
+
+
+''' Tasks matching every term, best match first. The vector expression is written out exactly as in the index, which PostgreSQL needs to use the index. '''
+def _postgresql_query(user_id, terms):
+    config = literal_column(f"'{TEXT_SEARCH_CONFIG}'")
+    vector = func.to_tsvector(config, func.coalesce(Task.body, literal_column("''")))
+    query = func.plainto_tsquery(config, ' '.join(terms))
+    return Task.query.filter(Task.user_id == user_id, vector.op('@@')(query)).order_by(
+        func.ts_rank(vector, query).desc(), Task.id.desc())
+
+
+''' Other databases have no text index here; fall back to matching each term anywhere in the body, newest first. '''
+def _fallback_query(user_id, terms):
+    return Task.query.filter(Task.user_id == user_id, *[Task.body.ilike(f'%{term}%') for term in terms]).order_by(
+        Task.timestamp.desc(), Task.id.desc())
+
+
+''' Search a user's tasks for 'text' and return one SearchPage of 'per_page' results. '''
+def search_tasks(user_id, text, page=1, per_page=50):
+    terms = search_terms(text)
+    page = max(page, 1)
+    if not terms:
+        return SearchPage([], page, False)
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        query = _sqlite_query(user_id, terms)
+    elif dialect == 'postgresql':
+        query = _postgresql_query(user_id, terms)
+    else:
+        query = _fallback_query(user_id, terms)
+    tasks = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    return SearchPage(tasks[:per_page], page, len(tasks) > per_page)
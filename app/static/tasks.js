@@ -0,0 +1,107 @@
+/* Fragment mode of the to-do list, see wants_fragment() in app/routes.py. Links and forms marked with data-fragment are
+   sent with fetch() and an 'X-Fragment: 1' header, and only the part of the page they change is replaced:
+
+     data-fragment="list"      a link, or the add task form: the response replaces the task list
+     data-fragment="row"       a link: the response replaces the task's row
+     data-fragment="remove"    a link: the task's row is removed
+     data-fragment="due-date"  the [+] link: opens a date input in the row, and the date is posted to the link
+
+   When a request fails the link or form is followed as usual, so the page then works as it does without JavaScript. */
+(function () {
+    'use strict';
+
+    if (!window.fetch || !window.FormData || !Element.prototype.closest) {
+        return;
+    }
+
+    function send(url, options) {
+        options = options || {};
+        options.credentials = 'same-origin';
+        options.headers = {'X-Fragment': '1'};
+        return fetch(url, options).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.text();
+        });
+    }
+
+    function replaceRow(row, html) {
+        var template = document.createElement('template');
+        template.innerHTML = html.trim();
+        row.replaceWith(template.content);
+    }
+
+    function replaceList(html) {
+        document.getElementById('task-list').innerHTML = html;
+    }
+
+    // A form field named 'submit' hides the form's own submit().
+    function submitForm(form) {
+        HTMLFormElement.prototype.submit.call(form);
+    }
+
+    function openDueDate(link) {
+        var token = document.querySelector('input[name="csrf_token"]');
+        if (!token) {
+            window.location.href = link.href;
+            return;
+        }
+        // Found now, while the link is still in the row it is about to be replaced in.
+        var row = link.closest('[data-task-row]');
+        var form = document.createElement('form');
+        form.innerHTML = '<input type="date" name="due_date" required> <button type="submit">Set</button>';
+        form.addEventListener('submit', function (event) {
+            event.preventDefault();
+            var data = new FormData(form);
+            data.append('csrf_token', token.value);
+            send(link.href, {method: 'POST', body: data}).then(function (html) {
+                replaceRow(row, html);
+            }).catch(function () {
+                window.location.href = link.href;
+            });
+        });
+        link.replaceWith(form);
+        form.elements.due_date.focus();
+    }
+
+    document.addEventListener('click', function (event) {
+        var link = event.target.closest('a[data-fragment]');
+        if (!link || event.button !== 0 || event.ctrlKey || event.metaKey || event.shiftKey || event.altKey) {
+            return;
+        }
+        event.preventDefault();
+        var mode = link.getAttribute('data-fragment');
+        if (mode === 'due-date') {
+            openDueDate(link);
+            return;
+        }
+        send(link.href).then(function (html) {
+            if (mode === 'list') {
+                replaceList(html);
+                // Keep the address in step with the list, for a reload.
+                window.history.replaceState(null, '', link.href);
+            } else if (mode === 'row') {
+                replaceRow(link.closest('[data-task-row]'), html);
+            } else if (mode === 'remove') {
+                link.closest('[data-task-row]').remove();
+            }
+        }).catch(function () {
+            window.location.href = link.href;
+        });
+    });
+
+    document.addEventListener('submit', function (event) {
+        var form = event.target;
+        if (form.getAttribute('data-fragment') !== 'list') {
+            return;
+        }
+        event.preventDefault();
+        send(form.action, {method: 'POST', body: new FormData(form)}).then(function (html) {
+            replaceList(html);
+            form.reset();
+        }).catch(function () {
+            submitForm(form);
+        });
+    });
+})();
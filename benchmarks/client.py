@@ -0,0 +1,89 @@
+''' Benchmark of the real routes through the Flask test client, in this process, so it measures the application and the database without any network or server overhead. For the heaviest user and a median user of the seeded database, and for every sort mode, it times the first page of /index with and without the task list cache, a page deep into the list, and a conditional GET answered with 304. It also times logging in. '''
+
+import re
+import time
+from benchmarks.common import queries_of, summarize
+from benchmarks.seed import PASSWORD
+
+NEXT_PAGE = re.compile(r'href="([^"]*after=[^"]*)"')
+
+
+def timed_get(client, path, samples, **kwargs):
+    start = time.perf_counter()
+    response = client.get(path, **kwargs)
+    samples.append((time.perf_counter() - start, queries_of(response.headers), response.status_code))
+    return response
+
+
+def case_result(samples, ok_statuses=(200,)):
+    return summarize([latency for latency, _, _ in samples], [queries for _, queries, _ in samples],
+                     errors=sum(1 for _, _, status in samples if status not in ok_statuses))
+
+
+''' Usernames of the user with the most tasks and of the user with the median number of tasks. '''
+def pick_users():
+    from app import db
+    from app.models import User, Task
+    counts = db.session.query(Task.user_id, db.func.count(Task.id)).group_by(Task.user_id).order_by(
+        db.func.count(Task.id).desc()).all()
+    picked = {'heaviest': counts[0], 'median': counts[len(counts) // 2]}
+    return {label: (User.query.get(user_id).username, count) for label, (user_id, count) in picked.items()}
+
+
+def run_client_benchmark(app, repeat=50, depth=20):
+    from app.models import TASK_SORTS
+    app.config['WTF_CSRF_ENABLED'] = False
+    task_cache = app.extensions['task_cache']
+    results = {}
+    with app.app_context():
+        users = pick_users()
+    cache_backend = task_cache.backend
+
+    for label, (username, task_count) in users.items():
+        client = app.test_client()
+        client.post('/login', data={'username': username, 'password': PASSWORD})
+        for sort_mode in TASK_SORTS:
+            client.get('/index', query_string={'sort': sort_mode})
+            case = f'{label} ({task_count} tasks) {sort_mode}'
+
+            task_cache.backend = None
+            samples = []
+            for _ in range(repeat):
+                timed_get(client, '/index', samples)
+            results[f'{case}: index first page, no cache'] = case_result(samples)
+
+            task_cache.backend = cache_backend
+            samples = []
+            for _ in range(repeat):
+                response = timed_get(client, '/index', samples)
+            results[f'{case}: index first page, cached'] = case_result(samples)
+
+            samples = []
+            etag = response.headers.get('ETag')
+            for _ in range(repeat):
+                timed_get(client, '/index', samples, headers={'If-None-Match': etag})
+            results[f'{case}: index conditional GET'] = case_result(samples, ok_statuses=(304,))
+
+            # Walk 'depth' pages into the list, then time that page.
+            task_cache.backend = None
+            path = '/index'
+            for _ in range(depth):
+                match = NEXT_PAGE.search(client.get(path).get_data(as_text=True))
+                if match is None:
+                    break
+                path = match.group(1).replace('&amp;', '&')
+            samples = []
+            for _ in range(repeat):
+                timed_get(client, path, samples)
+            results[f'{case}: index page {depth}, no cache'] = case_result(samples)
+            task_cache.backend = cache_backend
+
+    samples = []
+    username = users['median'][0]
+    for _ in range(max(1, repeat // 5)):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post('/login', data={'username': username, 'password': PASSWORD})
+        samples.append((time.perf_counter() - start, queries_of(response.headers), response.status_code))
+    results['login'] = case_result(samples, ok_statuses=(302,))
+    return results
@@ -0,0 +1,92 @@
+''' Helpers shared by the benchmarks: latency statistics, and saving results as JSON so runs can be compared. '''
+
+import datetime
+import json
+import os
+import platform
+import re
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Matches the query count in the Server-Timing header added by app/instrumentation.py.
+QUERIES_PATTERN = re.compile(r'desc="(\d+) queries"')
+
+
+''' Number of SQL queries a response reports in its Server-Timing header, or None if instrumentation is off. '''
+def queries_of(headers):
+    match = QUERIES_PATTERN.search(headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+''' Nearest-rank percentile of an already sorted list. '''
+def percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+
+''' Summary of one benchmark case: 'latencies' in seconds, 'queries' per request (None entries are skipped), and the wall time the requests took. '''
+def summarize(latencies, queries=(), errors=0, elapsed=None):
+    latencies = sorted(latencies)
+    queries = [count for count in queries if count is not None]
+    elapsed = elapsed if elapsed is not None else sum(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            'p50': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+            'max': round(latencies[-1] * 1000, 3) if latencies else None,
+        },
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+''' Write results to 'path' as JSON, together with what is needed to tell runs apart. Passwords are removed from the database URL. '''
+def save_results(path, benchmark, database_url, params, results):
+    document = {
+        'benchmark': benchmark,
+        'started': datetime.datetime.utcnow().isoformat() + 'Z',
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'database': re.sub(r'//([^:/@]+):[^@]*@', r'//\1:***@', database_url),
+        'params': params,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return document
+
+
+''' Print a side by side comparison of the cases two result files have in common. '''
+def compare(baseline_path, candidate_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+    print(f"{'case':60} {'p50 ms':>17} {'p95 ms':>17} {'req/s':>15} {'queries':>11}")
+    for case in sorted(set(baseline['results']) & set(candidate['results'])):
+        old, new = baseline['results'][case], candidate['results'][case]
+        print(f'{case:60} '
+              f"{_pair(old['latency_ms']['p50'], new['latency_ms']['p50']):>17} "
+              f"{_pair(old['latency_ms']['p95'], new['latency_ms']['p95']):>17} "
+              f"{_pair(old['throughput_rps'], new['throughput_rps']):>15} "
+              f"{_pair(old['queries_per_request'], new['queries_per_request']):>11}")
+
+
+def _pair(old, new):
+    if old is None or new is None:
+        return f'{old} -> {new}'
+    return f'{old:g} -> {new:g}'
@@ -0,0 +1,97 @@
+''' Concurrency benchmark of the database engine profiles (app/database.py). For each profile it starts writer and reader processes, like gunicorn workers, against the same database for a fixed time. Writers add tasks the way the index page does (insert the task, bump the user's task list version, commit), and readers load the first page of a user's task list. Every operation that fails, e.g. with "database is locked", is counted as an error; a profile passes when there are none, and the 'concurrency' command exits with status 1 when any profile has errors. '''
+
+import multiprocessing
+import random
+import time
+from benchmarks.common import summarize
+
+
+def make_app(database_url, profile):
+    from config import Config
+    from app import create_app
+    config = type('ProfileConfig', (Config,), {'SQLALCHEMY_DATABASE_URI': database_url, 'DATABASE_PROFILE': profile})
+    return create_app(config)
+
+
+def write(user_id, number):
+    from app import db
+    from app.models import User, Task
+    db.session.add(Task(body=f'Concurrency task {number}', user_id=user_id))
+    User.touch_tasks(user_id)
+    db.session.commit()
+
+
+def read(user_id, number):
+    from app.models import User
+    User.query.get(user_id).get_page_of_tasks()
+
+
+''' Body of one process: run 'role' ('write' or 'read') in a loop until 'deadline', and put its latencies and error count on 'results'. '''
+def worker(database_url, profile, role, user_ids, start, deadline, seed, results):
+    from app import db
+    app = make_app(database_url, profile)
+    operation = write if role == 'write' else read
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    with app.app_context():
+        while time.time() < start:
+            time.sleep(0.001)
+        while time.time() < deadline:
+            began = time.perf_counter()
+            try:
+                operation(rng.choice(user_ids), len(latencies))
+                latencies.append(time.perf_counter() - began)
+            except Exception as e:
+                db.session.rollback()
+                errors += 1
+                if errors == 1:
+                    print(f'{profile} {role}: {e.__class__.__name__}: {str(e).splitlines()[0]}')
+            finally:
+                db.session.remove()
+        db.engine.dispose()
+    results.put((role, latencies, errors))
+
+
+''' The journal mode of an SQLite database is kept in the file. Go back to the rollback journal a new database has, so a profile is not measured with the journal mode left by the one before, then connect once with the profile, which sets its own journal mode. That is done by 'flask db upgrade' before gunicorn starts (see the Procfile); if every process switched to WAL at once, two of them could each hold a read lock while waiting for the other's, and one would fail at once with "database is locked". '''
+def prepare_journal_mode(database_url, profile):
+    from app import db
+    for name in ('default', profile):
+        app = make_app(database_url, name)
+        with app.app_context():
+            if db.engine.dialect.name == 'sqlite':
+                db.session.execute('PRAGMA journal_mode = delete' if name == 'default' else 'SELECT 1')
+                db.session.remove()
+            db.engine.dispose()
+
+
+def run_concurrency_benchmark(database_url, profiles, writers=4, readers=4, duration=10):
+    with make_app(database_url, 'default').app_context():
+        from app.models import User
+        user_ids = [user_id for user_id, in User.query.with_entities(User.id).order_by(User.id).limit(100)]
+    if not user_ids:
+        raise SystemExit('The database has no users, run the seed command first.')
+
+    # Fresh interpreters, so each process opens its own connections, as gunicorn workers do.
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for profile in profiles:
+        prepare_journal_mode(database_url, profile)
+        queue = context.Queue()
+        start = time.time() + 3
+        deadline = start + duration
+        roles = ['write'] * writers + ['read'] * readers
+        processes = [context.Process(target=worker, args=(database_url, profile, role, user_ids, start, deadline,
+                                                          number, queue))
+                     for number, role in enumerate(roles)]
+        for process in processes:
+            process.start()
+        samples = {'write': ([], 0), 'read': ([], 0)}
+        for _ in processes:
+            role, latencies, errors = queue.get()
+            samples[role] = (samples[role][0] + latencies, samples[role][1] + errors)
+        for process in processes:
+            process.join()
+        for role, (latencies, errors) in samples.items():
+            results[f'concurrency {profile}: {role}'] = summarize(latencies, errors=errors, elapsed=duration)
+    return results
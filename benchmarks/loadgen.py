@@ -0,0 +1,91 @@
+''' HTTP load generator against the app served by gunicorn with gunicorn.conf.py, as in the Procfile. It starts gunicorn with the benchmark database, and 'clients' processes that each log in as a different seeded user and request the given paths in turn for 'duration' seconds, as fast as the server answers. Each client scrapes the CSRF token from the login form, like a browser would. '''
+
+import http.cookiejar
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from benchmarks.common import ROOT, queries_of, summarize
+from benchmarks.seed import PASSWORD
+
+CSRF_TOKEN = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+''' Start gunicorn on 127.0.0.1:port and wait until it answers. '''
+def start_server(database_url, port, workers, extra_args=()):
+    env = dict(os.environ, DATABASE_URL=database_url, INSTRUMENTATION_ENABLED='1')
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn.app.wsgiapp', '--config', 'gunicorn.conf.py',
+                               '--workers', str(workers), '--bind', f'127.0.0.1:{port}', *extra_args, 'todo:app'],
+                              cwd=ROOT, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1)
+            return server
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit('gunicorn did not start')
+
+
+def log_in(base_url, username):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    page = opener.open(f'{base_url}/login').read().decode('utf-8')
+    token = CSRF_TOKEN.search(page).group(1)
+    data = urllib.parse.urlencode({'csrf_token': token, 'username': username, 'password': PASSWORD}).encode()
+    opener.open(f'{base_url}/login', data)
+    return opener
+
+
+''' One client process. Returns {path: [(latency, queries, ok)]}. '''
+def client_worker(arguments):
+    base_url, username, paths, duration = arguments
+    opener = log_in(base_url, username)
+    samples = {path: [] for path in paths}
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        for path in paths:
+            start = time.perf_counter()
+            try:
+                response = opener.open(base_url + path)
+                response.read()
+                ok = True
+                headers = response.headers
+            except urllib.error.HTTPError as e:
+                ok = e.code == 304
+                headers = e.headers
+            except (urllib.error.URLError, ConnectionError):
+                ok, headers = False, {}
+            samples[path].append((time.perf_counter() - start, queries_of(headers), ok))
+    return samples
+
+
+def run_http_benchmark(app, database_url, paths, clients=8, workers=4, duration=10.0, port=8765, users=None):
+    from app.models import User
+    with app.app_context():
+        usernames = [username for username, in User.query.with_entities(User.username).order_by(User.id).limit(users or clients)]
+
+    server = start_server(database_url, port, workers)
+    try:
+        base_url = f'http://127.0.0.1:{port}'
+        work = [(base_url, usernames[number % len(usernames)], paths, duration) for number in range(clients)]
+        started = time.perf_counter()
+        with multiprocessing.Pool(clients) as pool:
+            per_client = pool.map(client_worker, work)
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = {}
+    for path in paths:
+        samples = [sample for client in per_client for sample in client[path]]
+        results[f'http {path}'] = summarize([latency for latency, _, _ in samples],
+                                            [queries for _, queries, _ in samples],
+                                            errors=sum(1 for _, _, ok in samples if not ok), elapsed=elapsed)
+    return results
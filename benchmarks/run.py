@@ -0,0 +1,130 @@
+''' Command line entry point of the benchmarks. Run from the repository root:
+
+    python -m benchmarks.run --database sqlite:////tmp/bench.db seed --users 1000 --tasks 200000
+    python -m benchmarks.run --database sqlite:////tmp/bench.db client --output before.json
+    python -m benchmarks.run --database sqlite:////tmp/bench.db http --clients 8 --duration 30 --output before-http.json
+    python -m benchmarks.run --database sqlite:////tmp/bench.db startup --output before-startup.json
+    python -m benchmarks.run --database sqlite:////tmp/bench.db concurrency --output profiles.json
+    python -m benchmarks.run compare before.json after.json
+
+Use a database made only for benchmarking: 'seed' refuses a database that already has users. The app is imported only after DATABASE_URL is set, so the benchmarks never touch the database in the configuration. '''
+
+import argparse
+import os
+import sys
+
+DEFAULT_PATHS = ['/index', '/index?sort=newest', '/index?sort=oldest', '/index?sort=due_date', '/export']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run')
+    parser.add_argument('--database', default=os.environ.get('BENCHMARK_DATABASE_URL', 'sqlite:////tmp/todo-benchmark.db'),
+                        help='database to seed and benchmark against')
+    commands = parser.add_subparsers(dest='command')
+
+    seed = commands.add_parser('seed', help='fill an empty database with users and tasks')
+    seed.add_argument('--users', type=int, default=1000)
+    seed.add_argument('--tasks', type=int, default=200000)
+    seed.add_argument('--skew', type=float, default=1.0, help='Zipf exponent of tasks per user')
+    seed.add_argument('--seed', type=int, default=0)
+
+    client = commands.add_parser('client', help='time the routes through the Flask test client')
+    client.add_argument('--repeat', type=int, default=50, help='requests per case')
+    client.add_argument('--depth', type=int, default=20, help='page number of the deep page case')
+    client.add_argument('--output', help='write the results to this JSON file')
+
+    http = commands.add_parser('http', help='load the app served by gunicorn over HTTP')
+    http.add_argument('--clients', type=int, default=8, help='concurrent client processes')
+    http.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    http.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    http.add_argument('--port', type=int, default=8765)
+    http.add_argument('--path', action='append', dest='paths', help=f'path to request, repeatable (default: {DEFAULT_PATHS})')
+    http.add_argument('--output', help='write the results to this JSON file')
+
+    startup = commands.add_parser('startup', help='time importing the app, create_app() and the first request')
+    startup.add_argument('--repeat', type=int, default=10, help='processes started per case')
+    startup.add_argument('--output', help='write the results to this JSON file')
+
+    concurrency = commands.add_parser('concurrency', help='run concurrent writer and reader processes per engine profile')
+    concurrency.add_argument('--profile', action='append', dest='profiles',
+                             help='engine profile to run, repeatable (default: all of them)')
+    concurrency.add_argument('--writers', type=int, default=4, help='processes adding tasks')
+    concurrency.add_argument('--readers', type=int, default=4, help='processes reading task lists')
+    concurrency.add_argument('--duration', type=float, default=10, help='seconds to run each profile')
+    concurrency.add_argument('--output', help='write the results to this JSON file')
+
+    compare = commands.add_parser('compare', help='compare two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+
+    if args.command == 'compare':
+        from benchmarks.common import compare as compare_results
+        compare_results(args.baseline, args.candidate)
+        return 0
+
+    if args.command in ('startup', 'concurrency'):
+        # These make their apps in new processes, with their own configuration.
+        if args.command == 'startup':
+            from benchmarks.startup import run_startup_benchmark
+            params = {'repeat': args.repeat}
+            results = run_startup_benchmark(args.database, args.repeat)
+        else:
+            from app.database import ENGINE_PROFILES
+            from benchmarks.concurrency import run_concurrency_benchmark
+            profiles = args.profiles or list(ENGINE_PROFILES)
+            params = {'profiles': profiles, 'writers': args.writers, 'readers': args.readers, 'duration': args.duration}
+            results = run_concurrency_benchmark(args.database, profiles, args.writers, args.readers, args.duration)
+        print_results(results)
+        if args.output:
+            from benchmarks.common import save_results
+            save_results(args.output, args.command, args.database, params, results)
+        failed = [case for case, result in results.items() if result['errors']]
+        if failed:
+            print(f"Operations failed in: {', '.join(failed)}", file=sys.stderr)
+            return 1
+        return 0
+
+    os.environ['DATABASE_URL'] = args.database
+    os.environ['INSTRUMENTATION_ENABLED'] = '1'
+    # The benchmarks sign in far more often than the rate limits allow.
+    os.environ['RATELIMIT_BACKEND'] = ''
+    from app import create_app
+    app = create_app()
+    from benchmarks.common import save_results
+
+    if args.command == 'seed':
+        from benchmarks.seed import seed_database
+        with app.app_context():
+            print(seed_database(args.users, args.tasks, args.skew, args.seed))
+        return 0
+
+    if args.command == 'client':
+        from benchmarks.client import run_client_benchmark
+        params = {'repeat': args.repeat, 'depth': args.depth}
+        results = run_client_benchmark(app, args.repeat, args.depth)
+    else:
+        from benchmarks.loadgen import run_http_benchmark
+        paths = args.paths or DEFAULT_PATHS
+        params = {'clients': args.clients, 'workers': args.workers, 'duration': args.duration, 'paths': paths}
+        results = run_http_benchmark(app, args.database, paths, args.clients, args.workers, args.duration, args.port)
+
+    print_results(results)
+    if args.output:
+        save_results(args.output, args.command, args.database, params, results)
+    return 0
+
+
+def print_results(results):
+    for case, result in results.items():
+        latency = result['latency_ms']
+        print(f"{case:60} p50 {latency['p50']} ms  p95 {latency['p95']} ms  p99 {latency['p99']} ms  "
+              f"{result['throughput_rps']} req/s  {result['queries_per_request']} queries  {result['errors']} errors")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
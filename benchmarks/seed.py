@@ -0,0 +1,51 @@
+''' Build a reproducible benchmark database: 'users' users sharing one password, and 'tasks' tasks spread over them with a Zipf-like skew, so a few users own most of the tasks as in production. The same seed always gives the same data. Rows are inserted with executemany in batches, and the database must be empty. '''
+
+import datetime
+import itertools
+import random
+
+PASSWORD = 'password'
+
+
+def seed_database(users, tasks, skew=1.0, seed=0, batch_size=10000):
+    from app import db
+    from app.models import User, Task
+
+    db.create_all()
+    if db.session.query(User.id).first() is not None:
+        raise SystemExit('The benchmark database already has users; seed an empty database.')
+
+    rng = random.Random(seed)
+    # Hashing is slow on purpose, so every user gets the same hash of the same password.
+    password_user = User()
+    password_user.set_password(PASSWORD)
+
+    for start in range(0, users, batch_size):
+        db.session.execute(User.__table__.insert(), [
+            {'username': f'user{number}', 'email': f'user{number}@example.com',
+             'password_hash': password_user.password_hash}
+            for number in range(start, min(start + batch_size, users))])
+    db.session.commit()
+
+    user_ids = [user_id for user_id, in db.session.query(User.id).order_by(User.id)]
+    # The user of rank r owns tasks in proportion to 1 / r ** skew.
+    cum_weights = list(itertools.accumulate(1 / rank ** skew for rank in range(1, len(user_ids) + 1)))
+    now = datetime.datetime.utcnow()
+    today = now.date()
+
+    for start in range(0, tasks, batch_size):
+        count = min(batch_size, tasks - start)
+        owners = rng.choices(user_ids, cum_weights=cum_weights, k=count)
+        rows = []
+        for number, owner in enumerate(owners, start):
+            has_due_date = rng.random() < 0.5
+            rows.append({
+                'body': f'Benchmark task {number}',
+                'timestamp': now - datetime.timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+                'user_id': owner,
+                'due_date': today + datetime.timedelta(days=rng.randrange(-60, 120)) if has_due_date else None,
+            })
+        db.session.execute(Task.__table__.insert(), rows)
+        db.session.commit()
+
+    return {'users': users, 'tasks': tasks, 'skew': skew, 'seed': seed}
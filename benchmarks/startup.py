@@ -0,0 +1,39 @@
+''' Startup benchmark: how long a new process takes to import the app, build it with create_app(), and answer its first request, as every gunicorn worker without preload_app, every 'flask' command, and every test run does. Each sample is a fresh Python process, so nothing is imported yet. The 'worker' case starts like gunicorn, the 'cli' case like the 'flask' command, which also loads Flask-Migrate and the maintenance commands. '''
+
+import json
+import os
+import subprocess
+import sys
+from benchmarks.common import ROOT, summarize
+
+SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get('/login')
+answered = time.perf_counter()
+print(json.dumps({'import': imported - started, 'create_app': created - imported, 'first_request': answered - created,
+                  'total': answered - started, 'status': response.status_code, 'modules': len(sys.modules)}))
+'''
+
+PHASES = ('import', 'create_app', 'first_request', 'total')
+
+
+def run_startup_benchmark(database_url, repeat=10):
+    results = {}
+    for case, extra_env in (('worker', {}), ('cli', {'FLASK_RUN_FROM_CLI': 'true'})):
+        env = {key: value for key, value in os.environ.items() if key != 'FLASK_RUN_FROM_CLI'}
+        env.update(DATABASE_URL=database_url, **extra_env)
+        samples = []
+        for _ in range(repeat):
+            process = subprocess.run([sys.executable, '-c', SCRIPT], cwd=ROOT, env=env, stdout=subprocess.PIPE,
+                                     check=True, universal_newlines=True)
+            samples.append(json.loads(process.stdout.splitlines()[-1]))
+        for phase in PHASES:
+            results[f'startup {case}: {phase}'] = summarize([sample[phase] for sample in samples],
+                                                            errors=sum(1 for sample in samples if sample['status'] != 200))
+        results[f'startup {case}: total']['modules_loaded'] = samples[-1]['modules']
+    return results
@@ -1,4 +1,5 @@
 import os
+import tempfile
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
@@ -12,3 +13,71 @@ class Config:
 
     ''' The SQLALCHEMY_TRACK_MODIFICATIONS configuration option is set to False to disable a feature of Flask-SQLAlchemy not needed, which is to signal the application every time a change is about to be made in the database. '''
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    ''' Database engine profile, see app/database.py: 'web' for the gunicorn workers, 'worker' for the 'flask' commands that run batches, or 'default' for the library defaults. It sets the connection pool (size, overflow, pre-ping, recycle) and, on SQLite, the WAL journal and other pragmas applied to each connection. '''
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE') or 'web'
+
+    ''' Read replica, see app/database.py. With REPLICA_DATABASE_URL set, read-only pages read from that database and everything else uses SQLALCHEMY_DATABASE_URI. After a user's own write their requests stay on the primary for REPLICA_STICKY_SECONDS, which should be longer than the replica's usual lag. '''
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')
+    SQLALCHEMY_BINDS = {'replica': REPLICA_DATABASE_URL} if REPLICA_DATABASE_URL else None
+    REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS') or 10)
+
+    # Number of tasks shown on each page of a user's to-do list.
+    TASKS_PER_PAGE = int(os.environ.get('TASKS_PER_PAGE') or 50)
+
+    ''' Cache of each user's rendered task list. 'lru' keeps up to TASK_CACHE_SIZE lists in each worker process, 'redis' shares them between workers through the server at TASK_CACHE_URL (or through TASK_CACHE_CLIENT, a client object with Redis's get() and setex(), when one is set), and an empty value turns caching off. Entries expire after TASK_CACHE_TTL seconds. '''
+    TASK_CACHE_BACKEND = os.environ.get('TASK_CACHE_BACKEND', 'lru')
+    TASK_CACHE_URL = os.environ.get('TASK_CACHE_URL')
+    TASK_CACHE_CLIENT = None
+    TASK_CACHE_SIZE = 1024
+    TASK_CACHE_TTL = 300
+
+    # JSON API: lifetime of bearer tokens in seconds, largest page of tasks, and most items in one batch request.
+    API_TOKEN_EXPIRES_IN = 3600
+    API_MAX_PER_PAGE = 500
+    API_MAX_BATCH = 1000
+
+    # Number of tasks inserted per transaction by the bulk importer.
+    IMPORT_CHUNK_SIZE = 1000
+
+    ''' Password hashing, see app/hashing.py. PASSWORD_HASH_METHOD and PASSWORD_HASH_ITERATIONS are passed to werkzeug's generate_password_hash, and a stored hash made with other settings is replaced at the user's next login. At most PASSWORD_HASH_MAX_CONCURRENT hashes run at once on the machine, counted with lock files in PASSWORD_HASH_SLOTS_DIR that all gunicorn workers share (empty: in each worker process), and a login that waits more than PASSWORD_HASH_TIMEOUT seconds for its turn is answered with 503. Hashes run on the request thread, or on a pool of PASSWORD_HASH_WORKERS threads or processes with PASSWORD_HASH_EXECUTOR 'thread' or 'process', which only helps threaded gunicorn workers. '''
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256'
+    PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS') or 150000)
+    PASSWORD_SALT_LENGTH = 8
+    PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR')
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_MAX_CONCURRENT = int(os.environ.get('PASSWORD_HASH_MAX_CONCURRENT') or 2)
+    PASSWORD_HASH_SLOTS_DIR = os.environ.get('PASSWORD_HASH_SLOTS_DIR', os.path.join(tempfile.gettempdir(), 'todo-hash-slots'))
+    PASSWORD_HASH_TIMEOUT = 1
+
+    ''' How Flask-Login loads the logged in user on each request: 'cached' keeps up to USER_CACHE_SIZE users in each worker process for at most USER_CACHE_TTL seconds and only reads their tasks_version and task_sort to check them, 'database' loads the whole user every time. '''
+    USER_LOADER = os.environ.get('USER_LOADER') or 'cached'
+    USER_CACHE_SIZE = 1024
+    USER_CACHE_TTL = 30
+
+    ''' Rate limits of sign-in attempts (logins, registrations, and API token requests), see app/ratelimit.py. Each client IP address may make RATELIMIT_IP_ATTEMPTS attempts at once, refilled at that many per RATELIMIT_IP_PERIOD seconds, and each account RATELIMIT_ACCOUNT_ATTEMPTS wrong passwords per RATELIMIT_ACCOUNT_PERIOD seconds; successful sign-ins do not count against an account. RATELIMIT_BACKEND 'memory' counts attempts in each worker process (for up to RATELIMIT_MEMORY_SIZE buckets), 'file' counts them for all worker processes of the machine in the SQLite file RATELIMIT_FILE, and an empty value turns rate limiting off. Behind RATELIMIT_PROXY_COUNT reverse proxies (1 on Heroku) the client address is read from X-Forwarded-For. '''
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND', 'memory')
+    RATELIMIT_FILE = os.environ.get('RATELIMIT_FILE') or os.path.join(tempfile.gettempdir(), 'todo-ratelimit.db')
+    RATELIMIT_MEMORY_SIZE = 10000
+    RATELIMIT_IP_ATTEMPTS = 10
+    RATELIMIT_IP_PERIOD = 60
+    RATELIMIT_ACCOUNT_ATTEMPTS = 5
+    RATELIMIT_ACCOUNT_PERIOD = 300
+    RATELIMIT_PROXY_COUNT = int(os.environ.get('RATELIMIT_PROXY_COUNT') or 0)
+
+    ''' Request instrumentation, off unless INSTRUMENTATION_ENABLED is set. It adds a Server-Timing header with the SQL and template time of each request, logs requests slower than SLOW_REQUEST_THRESHOLD seconds together with their statements, and serves per-endpoint histograms at /metrics to requests with the bearer token METRICS_TOKEN. '''
+    INSTRUMENTATION_ENABLED = bool(os.environ.get('INSTRUMENTATION_ENABLED'))
+    SLOW_REQUEST_THRESHOLD = float(os.environ.get('SLOW_REQUEST_THRESHOLD') or 0.5)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    ''' Due date reminders sent by 'flask send-reminders'. REMINDER_SINK is where they go: 'log', 'file:<path>' (one JSON object per line), or 'smtp:<host>:<port>' (an e-mail from REMINDER_MAIL_FROM). A task is reminded once, when its due date is at most REMINDER_LEAD_DAYS days away, and again after its due date is set again. Tasks that fell due at most REMINDER_LOOKBACK_DAYS days ago without a reminder, e.g. while no worker ran, are reminded too. A reminder that fails is tried again by the next runs, REMINDER_MAX_ATTEMPTS times in all. Tasks are read REMINDER_BATCH_SIZE at a time and delivered by REMINDER_WORKERS threads, every REMINDER_INTERVAL seconds. A worker process holds the scan for REMINDER_LEASE_SECONDS after each batch, so other worker processes wait their turn. Run totals are written in Prometheus text format to REMINDER_METRICS_FILE, if set. '''
+    REMINDER_SINK = os.environ.get('REMINDER_SINK') or 'log'
+    REMINDER_MAIL_FROM = os.environ.get('REMINDER_MAIL_FROM') or 'reminders@localhost'
+    REMINDER_LEAD_DAYS = 1
+    REMINDER_LOOKBACK_DAYS = 7
+    REMINDER_BATCH_SIZE = 500
+    REMINDER_WORKERS = 4
+    REMINDER_INTERVAL = 60
+    REMINDER_LEASE_SECONDS = 60
+    REMINDER_MAX_ATTEMPTS = 5
+    REMINDER_METRICS_FILE = os.environ.get('REMINDER_METRICS_FILE')
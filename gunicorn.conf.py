@@ -0,0 +1,25 @@
+''' gunicorn settings, used by the Procfile with 'gunicorn -c gunicorn.conf.py todo:app'.
+
+The app is loaded once in the master process (preload_app) and the workers are forked from it, so they start at once and share the memory of the loaded code copy-on-write. Two things keep that sharing from being undone: database connections are never carried across the fork (each worker disposes of the engine's pool and opens its own), and the objects made while loading are moved out of the garbage collector's reach with gc.freeze(), so collections in the workers do not write to, and so copy, every page of them. '''
+
+import gc
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+preload_app = True
+
+
+# Called in the master once the app is loaded, before any worker is forked.
+def when_ready(server):
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+# Called in each new worker. A connection made by the master would be shared by every worker.
+def post_fork(server, worker):
+    from app import db
+    app = server.app.wsgi()
+    with app.app_context():
+        for bind in [None] + list(app.config['SQLALCHEMY_BINDS'] or ()):
+            db.get_engine(app, bind=bind).dispose()
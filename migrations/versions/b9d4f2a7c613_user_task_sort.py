@@ -0,0 +1,53 @@
+"""user task sort
+
+Revision ID: b9d4f2a7c613
+Revises: a3c8e1f6b540
+Create Date: 2026-10-18 22:02:48.351907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b9d4f2a7c613'
+down_revision = 'a3c8e1f6b540'
+branch_labels = None
+depends_on = None
+
+# The user table as this migration sees it, for moving the sort preference between the old and new columns.
+user = sa.table('user',
+                sa.column('task_sort', sa.SmallInteger),
+                sa.column('view_tasks_by_newest', sa.Boolean),
+                sa.column('view_tasks_by_oldest', sa.Boolean),
+                sa.column('view_tasks_by_due_date', sa.Boolean))
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('task_sort', sa.SmallInteger(), server_default='0', nullable=False))
+
+    # Positions in SORT_MODES: 0 newest, 1 oldest, 2 due date.
+    op.execute(user.update().values(task_sort=sa.case([
+        (user.c.view_tasks_by_oldest == sa.true(), 1),
+        (user.c.view_tasks_by_due_date == sa.true(), 2),
+    ], else_=0)))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('view_tasks_by_due_date')
+        batch_op.drop_column('view_tasks_by_oldest')
+        batch_op.drop_column('view_tasks_by_newest')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('view_tasks_by_newest', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('view_tasks_by_oldest', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('view_tasks_by_due_date', sa.Boolean(), nullable=True))
+
+    op.execute(user.update().values(view_tasks_by_newest=user.c.task_sort == 0,
+                                    view_tasks_by_oldest=user.c.task_sort == 1,
+                                    view_tasks_by_due_date=user.c.task_sort == 2))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('task_sort')
@@ -0,0 +1,75 @@
+"""task reminded at
+
+Revision ID: c5a8e3b17d42
+Revises: b9d4f2a7c613
+Create Date: 2026-10-18 23:41:12.508316
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5a8e3b17d42'
+down_revision = 'b9d4f2a7c613'
+branch_labels = None
+depends_on = None
+
+# The tables as this migration sees them, for marking the tasks the old watermark scan had already reminded.
+task = sa.table('task',
+                sa.column('id', sa.Integer),
+                sa.column('due_date', sa.Date),
+                sa.column('reminded_at', sa.DateTime))
+reminder_watermark = sa.table('reminder_watermark',
+                              sa.column('due_date', sa.Date),
+                              sa.column('task_id', sa.Integer))
+
+# The full-text search triggers on task from e6a1c4d93f27. On SQLite, dropping a column copies the task table to a new one, which leaves its triggers behind, so they are dropped first and created again afterwards.
+FTS_TRIGGERS = {
+    'task_fts_insert': "CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN "
+                       "INSERT INTO task_fts (rowid, body) VALUES (new.id, new.body); END",
+    'task_fts_delete': "CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN "
+                       "INSERT INTO task_fts (task_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    'task_fts_update': "CREATE TRIGGER task_fts_update AFTER UPDATE OF body ON task BEGIN "
+                       "INSERT INTO task_fts (task_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+                       "INSERT INTO task_fts (rowid, body) VALUES (new.id, new.body); END",
+}
+
+
+def upgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reminded_at', sa.DateTime(), nullable=True))
+
+    # A task at or before a watermark's (due_date, task_id) was reminded by the scan that watermark belongs to.
+    passed = sa.exists().where(sa.and_(
+        reminder_watermark.c.due_date.isnot(None),
+        sa.or_(task.c.due_date < reminder_watermark.c.due_date,
+               sa.and_(task.c.due_date == reminder_watermark.c.due_date, task.c.id <= reminder_watermark.c.task_id))))
+    op.execute(task.update().where(passed).values(reminded_at=datetime.utcnow()))
+
+    op.create_index('ix_task_unreminded_due_date_id', 'task', ['due_date', 'id'], unique=False,
+                    postgresql_where=sa.text('reminded_at IS NULL'), sqlite_where=sa.text('reminded_at IS NULL'))
+
+    op.rename_table('reminder_watermark', 'reminder_lease')
+    with op.batch_alter_table('reminder_lease', schema=None) as batch_op:
+        batch_op.drop_column('task_id')
+        batch_op.drop_column('due_date')
+
+
+def downgrade():
+    with op.batch_alter_table('reminder_lease', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('due_date', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('task_id', sa.Integer(), server_default='0', nullable=False))
+    op.rename_table('reminder_lease', 'reminder_watermark')
+
+    op.drop_index('ix_task_unreminded_due_date_id', table_name='task')
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for name in FTS_TRIGGERS:
+            op.execute(f'DROP TRIGGER {name}')
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('reminded_at')
+    if sqlite:
+        for statement in FTS_TRIGGERS.values():
+            op.execute(statement)
@@ -0,0 +1,33 @@
+"""user password hash length
+
+Revision ID: d5f0b3a82c19
+Revises: c4e9a2f71b08
+Create Date: 2026-10-18 12:48:05.361927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f0b3a82c19'
+down_revision = 'c4e9a2f71b08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Room for hashes made with longer digests, e.g. pbkdf2:sha512.
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=128),
+               type_=sa.String(length=256),
+               existing_nullable=True)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=256),
+               type_=sa.String(length=128),
+               existing_nullable=True)
@@ -0,0 +1,24 @@
+"""drop task due date index
+
+Revision ID: d8b1f4c62e09
+Revises: c5a8e3b17d42
+Create Date: 2026-10-18 23:58:30.114502
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8b1f4c62e09'
+down_revision = 'c5a8e3b17d42'
+branch_labels = None
+depends_on = None
+
+
+# The (due_date, id) index over every task was read by the reminder scan, which now has its own partial index, and by archiving of overdue tasks, which is gone.
+def upgrade():
+    op.drop_index('ix_task_due_date_id', table_name='task')
+
+
+def downgrade():
+    op.create_index('ix_task_due_date_id', 'task', ['due_date', 'id'], unique=False)
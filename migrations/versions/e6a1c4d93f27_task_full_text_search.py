@@ -0,0 +1,43 @@
+"""task full text search
+
+Revision ID: e6a1c4d93f27
+Revises: d5f0b3a82c19
+Create Date: 2026-10-18 19:40:12.218604
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a1c4d93f27'
+down_revision = 'd5f0b3a82c19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        # FTS5 index over task.body, kept in sync by triggers, then filled from the existing tasks.
+        op.execute("CREATE VIRTUAL TABLE task_fts USING fts5(body, content='task', content_rowid='id')")
+        op.execute("CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN "
+                   "INSERT INTO task_fts (rowid, body) VALUES (new.id, new.body); END")
+        op.execute("CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN "
+                   "INSERT INTO task_fts (task_fts, rowid, body) VALUES ('delete', old.id, old.body); END")
+        op.execute("CREATE TRIGGER task_fts_update AFTER UPDATE OF body ON task BEGIN "
+                   "INSERT INTO task_fts (task_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+                   "INSERT INTO task_fts (rowid, body) VALUES (new.id, new.body); END")
+        op.execute("INSERT INTO task_fts (task_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        op.execute("CREATE INDEX ix_task_body_fts ON task USING gin (to_tsvector('english', coalesce(body, '')))")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute('DROP TRIGGER task_fts_update')
+        op.execute('DROP TRIGGER task_fts_delete')
+        op.execute('DROP TRIGGER task_fts_insert')
+        op.execute('DROP TABLE task_fts')
+    elif dialect == 'postgresql':
+        op.drop_index('ix_task_body_fts', table_name='task')
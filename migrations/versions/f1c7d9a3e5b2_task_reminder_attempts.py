@@ -0,0 +1,44 @@
+"""task reminder attempts
+
+Revision ID: f1c7d9a3e5b2
+Revises: d8b1f4c62e09
+Create Date: 2026-10-19 00:21:47.630915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c7d9a3e5b2'
+down_revision = 'd8b1f4c62e09'
+branch_labels = None
+depends_on = None
+
+# The full-text search triggers on task from e6a1c4d93f27. On SQLite, dropping a column copies the task table to a new one, which leaves its triggers behind, so they are dropped first and created again afterwards.
+FTS_TRIGGERS = {
+    'task_fts_insert': "CREATE TRIGGER task_fts_insert AFTER INSERT ON task BEGIN "
+                       "INSERT INTO task_fts (rowid, body) VALUES (new.id, new.body); END",
+    'task_fts_delete': "CREATE TRIGGER task_fts_delete AFTER DELETE ON task BEGIN "
+                       "INSERT INTO task_fts (task_fts, rowid, body) VALUES ('delete', old.id, old.body); END",
+    'task_fts_update': "CREATE TRIGGER task_fts_update AFTER UPDATE OF body ON task BEGIN "
+                       "INSERT INTO task_fts (task_fts, rowid, body) VALUES ('delete', old.id, old.body); "
+                       "INSERT INTO task_fts (rowid, body) VALUES (new.id, new.body); END",
+}
+
+
+def upgrade():
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reminder_attempts', sa.SmallInteger(), server_default='0', nullable=False))
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    if sqlite:
+        for name in FTS_TRIGGERS:
+            op.execute(f'DROP TRIGGER {name}')
+    with op.batch_alter_table('task', schema=None) as batch_op:
+        batch_op.drop_column('reminder_attempts')
+    if sqlite:
+        for statement in FTS_TRIGGERS.values():
+            op.execute(statement)
@@ -0,0 +1,113 @@
+''' POST /api/tasks/batch (app/api.py): a result for every item in request order, validation and ownership per item, conflicting ids, and one new tasks_version for the whole batch. '''
+
+import datetime
+import pytest
+from config import Config
+from app import create_app, db
+from app.models import User, Task
+
+
+class BatchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    DATABASE_PROFILE = 'default'
+    TASK_CACHE_BACKEND = None
+    RATELIMIT_BACKEND = None
+
+
+@pytest.fixture
+def app():
+    app = create_app(BatchConfig)
+    with app.app_context():
+        db.create_all()
+        for name in ('alice', 'bob'):
+            db.session.add(User(username=name, email=f'{name}@example.com'))
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def alice(app):
+    return User.query.filter_by(username='alice').one()
+
+
+def add_tasks(user, count):
+    tasks = [Task(body=f'{user.username} {number}', user_id=user.id) for number in range(count)]
+    db.session.add_all(tasks)
+    db.session.commit()
+    return [task.id for task in tasks]
+
+
+def batch(app, user, payload):
+    token = user.get_token(3600)
+    db.session.commit()
+    response = app.test_client().post('/api/tasks/batch', json=payload, headers={'Authorization': f'Bearer {token}'})
+    db.session.expire_all()
+    return response
+
+
+def statuses(results):
+    return [result['status'] for result in results]
+
+
+def test_creates_in_request_order(app, alice):
+    payload = {'create': [{'body': 'first'}, {'body': 'second', 'due_date': '2026-10-20'}, {'body': 'third'}]}
+    results = batch(app, alice, payload).get_json()['create']
+    assert statuses(results) == ['created'] * 3
+    tasks = [Task.query.get(result['id']) for result in results]
+    assert [task.body for task in tasks] == ['first', 'second', 'third']
+    assert tasks[1].due_date == datetime.date(2026, 10, 20)
+    assert all(task.user_id == alice.id and task.timestamp and task.reminder_attempts == 0 for task in tasks)
+
+
+def test_failed_items_are_skipped(app, alice):
+    first, second = add_tasks(alice, 2)
+    payload = {'create': [{'body': 'ok'}, {'body': 7}, 'not an object', {'body': 'bad date', 'due_date': '20/10/2026'}],
+               'update': [{'id': first, 'due_date': 'soon'}, {'id': second}, {'id': second + 1, 'due_date': None}]}
+    results = batch(app, alice, payload).get_json()
+    assert statuses(results['create']) == ['created', 'error', 'error', 'error']
+    assert statuses(results['update']) == ['error', 'error', 'error']
+    assert Task.query.filter_by(user_id=alice.id).count() == 3
+
+
+def test_tasks_of_other_users_are_not_found(app, alice):
+    bob = User.query.filter_by(username='bob').one()
+    theirs, = add_tasks(bob, 1)
+    payload = {'update': [{'id': theirs, 'due_date': '2026-10-20'}], 'delete': [theirs + 1000]}
+    results = batch(app, alice, payload).get_json()
+    assert results['update'] == [{'id': theirs, 'status': 'error', 'error': 'task not found'}]
+    assert statuses(results['delete']) == ['error']
+    assert Task.query.get(theirs).due_date is None
+
+
+def test_ids_must_be_integers(app, alice):
+    first, second = add_tasks(alice, 2)
+    payload = {'update': [{'id': True, 'due_date': None}, {'id': str(first), 'due_date': None}],
+               'delete': [False, [second], {'id': second}, 1.0]}
+    results = batch(app, alice, payload).get_json()
+    assert statuses(results['update'] + results['delete']) == ['error'] * 6
+    assert Task.query.filter_by(user_id=alice.id).count() == 2
+
+
+def test_conflicting_ids_are_left_alone(app, alice):
+    both, twice, single = add_tasks(alice, 3)
+    payload = {'update': [{'id': both, 'due_date': '2026-10-20'}, {'id': single, 'due_date': '2026-10-21'}],
+               'delete': [both, twice, twice]}
+    results = batch(app, alice, payload).get_json()
+    assert statuses(results['update']) == ['conflict', 'updated']
+    assert statuses(results['delete']) == ['conflict', 'conflict', 'conflict']
+    assert Task.query.get(both).due_date is None
+    assert Task.query.get(twice) is not None
+    assert Task.query.get(single).due_date == datetime.date(2026, 10, 21)
+
+
+def test_version_is_bumped_once_per_batch(app, alice):
+    first, second = add_tasks(alice, 2)
+    version = alice.tasks_version
+    payload = {'create': [{'body': 'new'}], 'update': [{'id': first, 'due_date': '2026-10-20'}], 'delete': [second]}
+    batch(app, alice, payload)
+    assert User.query.get(alice.id).tasks_version == version + 1
+    # A batch that changes nothing leaves the version alone.
+    batch(app, alice, {'delete': [second]})
+    assert User.query.get(alice.id).tasks_version == version + 1
@@ -0,0 +1,25 @@
+''' A short run of the concurrency benchmark (benchmarks/concurrency.py) against an SQLite file: with the tuned engine profiles, concurrent writer and reader processes must never fail, e.g. with "database is locked". '''
+
+import pytest
+from config import Config
+from app import create_app
+from benchmarks.concurrency import run_concurrency_benchmark
+from benchmarks.seed import seed_database
+
+
+@pytest.fixture
+def database_url(tmp_path):
+    database_url = f"sqlite:///{tmp_path / 'concurrency.db'}"
+    app = create_app(type('SeedConfig', (Config,), {'SQLALCHEMY_DATABASE_URI': database_url,
+                                                      'DATABASE_PROFILE': 'default'}))
+    with app.app_context():
+        seed_database(users=5, tasks=200)
+    return database_url
+
+
+@pytest.mark.parametrize('profile', ['web', 'worker'])
+def test_profile_has_no_errors(database_url, profile):
+    results = run_concurrency_benchmark(database_url, [profile], writers=3, readers=3, duration=1)
+    for case, result in results.items():
+        assert result['requests'], case
+        assert result['errors'] == 0, case
@@ -0,0 +1,58 @@
+''' The migrations, run against an SQLite file: upgrading to the head, downgrading to the first revision, and upgrading again must leave the same schema, with the full-text search triggers of e6a1c4d93f27 still keeping task_fts in step with the task table. '''
+
+import os
+import pytest
+from flask_migrate import Migrate, upgrade, downgrade
+from config import Config
+from app import create_app, db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+FIRST_REVISION = '9b3b1bdc8ce2'
+
+
+@pytest.fixture
+def app(tmp_path):
+    config = type('MigrationConfig', (Config,), {'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'migrations.db'}",
+                                                 'DATABASE_PROFILE': 'default'})
+    app = create_app(config)
+    Migrate(app, db, directory=MIGRATIONS)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+''' The tables, indexes, and triggers of the database with their SQL. A table rebuilt by a batch migration is written with its name quoted, which is the only difference ignored. '''
+def schema():
+    rows = db.session.execute("SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' "
+                              "AND name != 'alembic_version'")
+    return sorted((type_, name, (sql or '').replace('"', '')) for type_, name, sql in rows)
+
+
+def search(word):
+    return [task_id for task_id, in db.session.execute(
+        'SELECT rowid FROM task_fts WHERE task_fts MATCH :word ORDER BY rowid', {'word': word})]
+
+
+def test_round_trip_keeps_schema_and_search_triggers(app):
+    upgrade()
+    head = schema()
+    assert {name for type_, name, sql in head if type_ == 'trigger'} == {
+        'task_fts_insert', 'task_fts_delete', 'task_fts_update'}
+
+    downgrade(revision=FIRST_REVISION)
+    db.session.remove()
+    upgrade()
+    assert schema() == head
+
+    db.session.execute("INSERT INTO user (id, username, email, tasks_version, task_sort) "
+                       "VALUES (1, 'migrator', 'migrator@example.com', 1, 0)")
+    db.session.execute("INSERT INTO task (id, body, user_id) VALUES (1, 'water the plants', 1)")
+    db.session.execute("UPDATE task SET body = 'water the garden' WHERE id = 1")
+    db.session.commit()
+    assert search('garden') == [1]
+    assert search('plants') == []
+    db.session.execute('DELETE FROM task WHERE id = 1')
+    db.session.commit()
+    assert search('garden') == []
@@ -0,0 +1,65 @@
+''' Sign-in rate limiting (app/ratelimit.py) through the API's token endpoint: successful sign-ins never count against an account, wrong passwords do, and the client address caps every attempt. '''
+
+from base64 import b64encode
+import pytest
+from config import Config
+from app import create_app, db
+from app.models import User
+
+
+class RateLimitConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    DATABASE_PROFILE = 'default'
+    TASK_CACHE_BACKEND = None
+    RATELIMIT_BACKEND = 'memory'
+    RATELIMIT_IP_ATTEMPTS = 100
+    RATELIMIT_ACCOUNT_ATTEMPTS = 3
+    PASSWORD_HASH_ITERATIONS = 1000
+    PASSWORD_HASH_SLOTS_DIR = ''
+
+
+@pytest.fixture
+def app():
+    app = create_app(RateLimitConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(username='alice', email='alice@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def get_token(client, username, password, ip='10.0.0.1'):
+    credentials = b64encode(f'{username}:{password}'.encode()).decode()
+    return client.post('/api/tokens', headers={'Authorization': f'Basic {credentials}'},
+                       environ_base={'REMOTE_ADDR': ip})
+
+
+def test_successful_sign_ins_are_not_limited(app):
+    client = app.test_client()
+    for _ in range(RateLimitConfig.RATELIMIT_ACCOUNT_ATTEMPTS * 3):
+        assert get_token(client, 'alice', 'secret').status_code == 200
+
+
+def test_wrong_passwords_lock_the_account(app):
+    client = app.test_client()
+    for _ in range(RateLimitConfig.RATELIMIT_ACCOUNT_ATTEMPTS):
+        assert get_token(client, 'alice', 'wrong', ip='10.0.0.2').status_code == 401
+    # From any address, and with the right password, until the bucket refills.
+    response = get_token(client, 'Alice', 'secret', ip='10.0.0.3')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+    # Other accounts are unaffected.
+    assert get_token(client, 'bob', 'wrong', ip='10.0.0.3').status_code == 401
+
+
+def test_client_address_caps_every_attempt(app):
+    app.extensions['rate_limiter'].ip_limit = (2, 60)
+    client = app.test_client()
+    assert get_token(client, 'alice', 'secret').status_code == 200
+    assert get_token(client, 'alice', 'secret').status_code == 200
+    assert get_token(client, 'alice', 'secret').status_code == 429
+    assert get_token(client, 'alice', 'secret', ip='10.0.0.9').status_code == 200
@@ -0,0 +1,103 @@
+''' The due date reminder scan (app/reminders.py) with a sink that records what it is sent and fails for chosen tasks. '''
+
+import datetime
+import pytest
+from config import Config
+from app import create_app, db
+from app.models import User, Task
+from app.reminders import ReminderScheduler
+
+TODAY = datetime.date(2026, 10, 18)
+
+
+class ReminderConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    DATABASE_PROFILE = 'default'
+    RATELIMIT_BACKEND = None
+
+
+class RecordingSink:
+    def __init__(self):
+        self.sent = []
+        self.failing = set()
+
+    def send(self, reminder):
+        if reminder.task_id in self.failing:
+            raise OSError('could not deliver')
+        self.sent.append(reminder.task_id)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def app():
+    app = create_app(ReminderConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='reminded', email='reminded@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def add_tasks(user, count, due_date):
+    tasks = [Task(body=f'task {number}', user_id=user.id, due_date=due_date) for number in range(count)]
+    db.session.add_all(tasks)
+    db.session.commit()
+    return [task.id for task in tasks]
+
+
+def run(scheduler, sink):
+    sink.sent = []
+    scheduler.run_once(TODAY)
+    return sink.sent
+
+
+def test_each_task_is_reminded_once(user):
+    sink = RecordingSink()
+    scheduler = ReminderScheduler(sink, batch_size=2)
+    tomorrow = add_tasks(user, 5, TODAY + datetime.timedelta(days=1))
+    add_tasks(user, 2, TODAY + datetime.timedelta(days=30))
+    assert run(scheduler, sink) == tomorrow
+    assert run(scheduler, sink) == []
+
+
+def test_short_notice_due_date_is_reminded(user):
+    sink = RecordingSink()
+    scheduler = ReminderScheduler(sink, batch_size=2)
+    early, later = add_tasks(user, 2, TODAY + datetime.timedelta(days=30))
+    add_tasks(user, 3, TODAY + datetime.timedelta(days=1))
+    run(scheduler, sink)
+    # A lower id than every task reminded so far, and a due date before theirs.
+    Task.query.get(early).set_due_date(TODAY)
+    db.session.commit()
+    assert run(scheduler, sink) == [early]
+
+
+def test_failing_reminders_do_not_hold_up_the_others(user):
+    sink = RecordingSink()
+    scheduler = ReminderScheduler(sink, batch_size=2, max_attempts=3)
+    failing = add_tasks(user, 2, TODAY)
+    others = add_tasks(user, 3, TODAY + datetime.timedelta(days=1))
+    sink.failing = set(failing)
+    # The first batch fails in full, which ends the run; the failures are counted all the same.
+    assert run(scheduler, sink) == []
+    sink.failing = {failing[0]}
+    assert run(scheduler, sink) == [failing[1]] + others
+    assert Task.query.get(failing[0]).reminder_attempts == 2
+    assert run(scheduler, sink) == []
+    # Given up after three attempts, until the due date is set again.
+    assert Task.query.get(failing[0]).reminder_attempts == 3
+    sink.failing = set()
+    assert run(scheduler, sink) == []
+    Task.query.get(failing[0]).set_due_date(TODAY)
+    db.session.commit()
+    assert run(scheduler, sink) == [failing[0]]
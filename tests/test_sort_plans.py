@@ -0,0 +1,95 @@
+''' The queries of every task sort, checked with SQLite's EXPLAIN QUERY PLAN: each segment of TASK_SORTS must be read in order off one of the (user_id, ...) composite indexes, never sorted in a temporary B-tree. '''
+
+import datetime
+import pytest
+from sqlalchemy import event
+from config import Config
+from app import create_app, db
+from app.models import User, Task, TASK_SORTS
+
+
+class PlanConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    DATABASE_PROFILE = 'default'
+    TASK_CACHE_BACKEND = None
+    RATELIMIT_BACKEND = None
+
+
+@pytest.fixture
+def app():
+    app = create_app(PlanConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='planner', email='planner@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    start = datetime.date(2020, 1, 1)
+    for number in range(6):
+        due_date = start + datetime.timedelta(days=number) if number % 2 else None
+        db.session.add(Task(body=f'task {number}', user_id=user.id, due_date=due_date,
+                            timestamp=datetime.datetime(2020, 1, 1, number)))
+    db.session.commit()
+    return user
+
+
+''' The task queries run inside the block, as (statement, parameters) pairs. '''
+class TaskQueries:
+    def __init__(self):
+        self.queries = []
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith('SELECT') and 'FROM task' in statement and 'ORDER BY' in statement:
+            self.queries.append((statement, parameters))
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+
+
+def query_plan(statement, parameters):
+    cursor = db.session.connection().connection.cursor()
+    try:
+        return [row[-1] for row in cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+    finally:
+        cursor.close()
+
+
+def assert_index_order(queries):
+    assert queries
+    for statement, parameters in queries:
+        plan = query_plan(statement, parameters)
+        assert any('ix_task_user_id_' in step for step in plan), (statement, plan)
+        assert not any('TEMP B-TREE' in step for step in plan), (statement, plan)
+
+
+@pytest.mark.parametrize('sort_mode', sorted(TASK_SORTS))
+def test_pages_read_in_index_order(app, user, sort_mode):
+    user.set_sort_mode(sort_mode)
+    with TaskQueries() as recorded:
+        first = user.get_page_of_tasks(per_page=2)
+        second = user.get_page_of_tasks(after=first.next_cursor, per_page=2)
+        user.get_page_of_tasks(before=second.prev_cursor, per_page=2)
+    assert second.tasks
+    # A page may span segments; every segment it reads must use an index.
+    assert len(recorded.queries) >= 3
+    assert_index_order(recorded.queries)
+
+
+@pytest.mark.parametrize('sort_mode', sorted(TASK_SORTS))
+def test_sorted_view_reads_each_segment_in_index_order(app, user, sort_mode):
+    user.set_sort_mode(sort_mode)
+    with TaskQueries() as recorded:
+        tasks = user.get_sorted_view_of_tasks()
+    assert len(tasks) == 6
+    assert len(recorded.queries) == len(TASK_SORTS[sort_mode])
+    assert_index_order(recorded.queries)
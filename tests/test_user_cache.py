@@ -0,0 +1,45 @@
+''' The cached user loader (UserCache in app/cache.py, load_user in app/models.py) with two apps on one SQLite file, standing in for two worker processes: a change made through one must show in the other at its next request. '''
+
+from base64 import b64encode
+import pytest
+from config import Config
+from app import create_app, db
+from app.models import User
+
+
+@pytest.fixture
+def apps(tmp_path):
+    config = type('WorkerConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'todo.db'}", 'DATABASE_PROFILE': 'default',
+        'USER_LOADER': 'cached', 'TASK_CACHE_BACKEND': 'lru', 'RATELIMIT_BACKEND': None,
+        'WTF_CSRF_ENABLED': False, 'PASSWORD_HASH_ITERATIONS': 1000, 'PASSWORD_HASH_SLOTS_DIR': ''})
+    first, second = create_app(config), create_app(config)
+    with first.app_context():
+        db.create_all()
+        user = User(username='alice', email='alice@example.com')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+    yield first, second
+    with first.app_context():
+        db.drop_all()
+
+
+def test_change_through_another_worker_is_seen(apps):
+    first, second = apps
+    browser = first.test_client()
+    browser.post('/login', data={'username': 'alice', 'password': 'secret'})
+    page = browser.get('/index')
+    assert page.status_code == 200
+    assert browser.get('/index', headers={'If-None-Match': page.headers['ETag']}).status_code == 304
+
+    api = second.test_client()
+    credentials = b64encode(b'alice:secret').decode()
+    token = api.post('/api/tokens', headers={'Authorization': f'Basic {credentials}'}).get_json()['token']
+    response = api.post('/api/tasks/batch', json={'create': [{'body': 'Water the plants'}]},
+                        headers={'Authorization': f'Bearer {token}'})
+    assert response.get_json()['create'][0]['status'] == 'created'
+
+    page = browser.get('/index', headers={'If-None-Match': page.headers['ETag']})
+    assert page.status_code == 200
+    assert b'Water the plants' in page.data
@@ -1,7 +1,4 @@
-from app import app, db
-from app.models import User, Task
+from app import create_app
 
-# 'flask shell' in terminal to use python shell
-@app.shell_context_processor
-def make_shell_context():
-    return {'db': db, 'User': User, 'Task': Task}
+# The app served by gunicorn ('gunicorn todo:app') and loaded by the 'flask' command (FLASK_APP=todo.py).
+app = create_app()